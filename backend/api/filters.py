@@ -1,6 +1,19 @@
+from django.conf import settings
+from django.db.models import Count, Exists, OuterRef
 from django_filters import rest_framework as filters
+from rest_framework.filters import OrderingFilter
 
-from recipes.models import Ingredient, Recipe
+from recipes.cache import get_recipe_ids, get_tag_map
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart
+
+TAGS_MODES = (
+    ('any', 'Любой из тэгов'),
+    ('all', 'Все тэги'),
+)
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in get_tag_map()]
 
 
 class IngredientFilter(filters.FilterSet):
@@ -13,32 +26,90 @@ class IngredientFilter(filters.FilterSet):
         fields = ('name',)
 
 
+class StableOrderingFilter(OrderingFilter):
+    """Сортировка, дополненная id для однозначного порядка страниц."""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and not any(
+            field.lstrip('-') in ('id', 'pk') for field in ordering
+        ):
+            ordering = (*ordering, '-id')
+        return ordering
+
+
 class RecipeFilter(filters.FilterSet):
     """Фильтр для рецептов."""
 
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = filters.MultipleChoiceFilter(
+        choices=get_tag_choices, method='get_tags',
+    )
+    tags_mode = filters.ChoiceFilter(
+        choices=TAGS_MODES, method='get_tags_mode',
+    )
     is_favorited = filters.BooleanFilter(method='get_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart',
     )
+    search = filters.CharFilter(method='get_search')
 
     class Meta:
         model = Recipe
         fields = (
             'tags',
+            'tags_mode',
             'author',
             'is_favorited',
             'is_in_shopping_cart',
+            'search',
         )
 
-    def get_is_favorited(self, qs, name, value):
+    def get_tags(self, qs, name, value):
+        """Рецепты с любым или со всеми выбранными тэгами.
+
+        Фильтр строится подзапросом к таблице связей, поэтому рецепт
+        не повторяется в выдаче при совпадении нескольких тэгов.
+        """
+
+        tag_map = get_tag_map()
+        tag_ids = {tag_map[slug] for slug in value if slug in tag_map}
+        recipe_tags = Recipe.tags.through.objects.filter(tag__in=tag_ids)
+        if self.form.cleaned_data.get('tags_mode') == 'all':
+            return qs.filter(id__in=recipe_tags.values('recipe').annotate(
+                tags_count=Count('tag'),
+            ).filter(
+                tags_count=len(tag_ids),
+            ).values('recipe'))
+        return qs.filter(Exists(recipe_tags.filter(recipe=OuterRef('pk'))))
+
+    def get_tags_mode(self, qs, name, value):
+        return qs
+
+    def filter_user_recipes(self, qs, model):
+        """Рецепты из избранного или корзины пользователя.
+
+        Небольшое множество id из кэша подставляется списком, а большое
+        заменяется подзапросом по индексу, чтобы не передавать в базу
+        данных тысячи параметров.
+        """
+
         user = self.request.user
-        if value and user.is_authenticated:
-            return qs.filter(favorite_recipe__user=user)
+        recipe_ids = get_recipe_ids(model, user.id)
+        if len(recipe_ids) <= settings.RECIPE_IDS_FILTER_LIMIT:
+            return qs.filter(id__in=recipe_ids)
+        return qs.filter(Exists(model.objects.filter(
+            recipe=OuterRef('pk'), user=user,
+        )))
+
+    def get_is_favorited(self, qs, name, value):
+        if value and self.request.user.is_authenticated:
+            return self.filter_user_recipes(qs, Favorite)
         return qs
 
     def get_is_in_shopping_cart(self, qs, name, value):
-        user = self.request.user
-        if value and user.is_authenticated:
-            return qs.filter(shopping_recipe__user=user)
+        if value and self.request.user.is_authenticated:
+            return self.filter_user_recipes(qs, ShoppingCart)
         return qs
+
+    def get_search(self, qs, name, value):
+        return qs.search(value)
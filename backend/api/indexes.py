@@ -0,0 +1,263 @@
+from bisect import bisect_left
+from collections import namedtuple
+from threading import Lock
+
+import numpy as np
+
+from recipes.cache import (
+    ALL_RECIPES, INGREDIENTS_VERSION_KEY, get_recipe_changes,
+    get_recipe_changes_position, get_version,
+)
+from recipes.models import Ingredient, RecipeIngredient
+
+MAX_PENDING_CHANGES = 1000
+
+PantryState = namedtuple(
+    'PantryState',
+    ('recipe_ids', 'rows', 'sizes', 'postings', 'ingredients'),
+)
+
+
+class IngredientIndex:
+    """Префиксный индекс ингредиентов в памяти процесса.
+
+    Названия хранятся в отсортированном списке в нижнем регистре,
+    поиск по префиксу выполняется бинарным поиском. Индекс строится
+    при первом обращении и перестраивается, когда меняется версия
+    справочника ингредиентов в общем кэше.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.version = None
+        self.keys = []
+        self.items = []
+
+    def build(self, version):
+        rows = sorted(
+            (
+                (name.casefold(), {
+                    'id': pk, 'name': name, 'measurement_unit': unit,
+                })
+                for pk, name, unit in Ingredient.objects.values_list(
+                    'id', 'name', 'measurement_unit',
+                )
+            ),
+            key=lambda row: (row[0], row[1]['id']),
+        )
+        self.keys = [key for key, _ in rows]
+        self.items = [item for _, item in rows]
+        self.version = version
+
+    def refresh(self):
+        version = get_version(INGREDIENTS_VERSION_KEY)
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.build(version)
+
+    def search(self, name, limit):
+        """Ингредиенты, начинающиеся с name, затем содержащие name."""
+
+        self.refresh()
+        keys, items = self.keys, self.items
+        query = name.casefold()
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and end - start < limit:
+            if not keys[end].startswith(query):
+                break
+            end += 1
+        result = items[start:end]
+        if len(result) < limit:
+            for key, item in zip(keys, items):
+                if query in key and not key.startswith(query):
+                    result.append(item)
+                    if len(result) == limit:
+                        break
+        return result
+
+
+ingredient_index = IngredientIndex()
+
+
+class PantryMatches:
+    """Ранжированные рецепты с ленивой сортировкой.
+
+    Срез возвращает пары (id рецепта, количество недостающих
+    ингредиентов); сортируются только рецепты до конца среза,
+    поэтому страница выдачи не требует сортировки всех совпадений.
+    """
+
+    def __init__(self, recipe_ids, missing, keys):
+        self.recipe_ids = recipe_ids
+        self.missing = missing
+        self.keys = keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            index = range(len(self))[index]
+            return self[index:index + 1][0]
+        start, stop, _ = index.indices(len(self))
+        if stop <= start:
+            return []
+        if stop < len(self):
+            top = np.argpartition(self.keys, stop - 1)[:stop]
+        else:
+            top = np.arange(len(self))
+        top = top[np.argsort(self.keys[top])][start:]
+        return list(zip(
+            self.recipe_ids[top].tolist(), self.missing[top].tolist(),
+        ))
+
+
+class PantryIndex:
+    """Обратный индекс ингредиент → рецепты в памяти процесса.
+
+    Для каждого ингредиента хранится отсортированный массив номеров
+    рецептов, а для каждого рецепта — количество его ингредиентов.
+    Изменения рецептов применяются по журналу из общего кэша: заново
+    загружаются только изменённые рецепты. Состояние заменяется
+    целиком, поэтому поиск идёт без блокировки.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.position = None
+        self.state = None
+
+    def build(self, position):
+        pairs = np.array(
+            list(RecipeIngredient.objects.order_by().values_list(
+                'recipe_id', 'ingredient_id',
+            )),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        recipe_ids, rows, sizes = np.unique(
+            pairs[:, 0], return_inverse=True, return_counts=True,
+        )
+        rows = rows.astype(np.int32)
+        order = np.argsort(rows, kind='stable')
+        ingredients = dict(enumerate(np.split(
+            pairs[order, 1], np.cumsum(sizes)[:-1],
+        )))
+        order = np.argsort(pairs[:, 1], kind='stable')
+        keys, starts = np.unique(pairs[order, 1], return_index=True)
+        self.state = PantryState(
+            recipe_ids,
+            dict(zip(recipe_ids.tolist(), range(len(recipe_ids)))),
+            sizes.astype(np.int32),
+            dict(zip(keys.tolist(), np.split(rows[order], starts[1:]))),
+            ingredients,
+        )
+        self.position = position
+
+    def apply(self, recipe_ids):
+        """Заменяет в индексе ингредиенты рецептов recipe_ids.
+
+        Копируются только словари и массив размеров, а массивы рецептов
+        пересобираются лишь для затронутых ингредиентов.
+        """
+
+        state = self.state
+        loaded = {}
+        for recipe, ingredient in RecipeIngredient.objects.filter(
+            recipe__in=recipe_ids,
+        ).values_list('recipe_id', 'ingredient_id'):
+            loaded.setdefault(recipe, []).append(ingredient)
+        rows = dict(state.rows)
+        for recipe in loaded:
+            rows.setdefault(recipe, len(rows))
+        new_ids = list(rows)[len(state.recipe_ids):]
+        sizes = np.concatenate((
+            state.sizes, np.zeros(len(new_ids), dtype=np.int32),
+        ))
+        postings = dict(state.postings)
+        ingredients = dict(state.ingredients)
+        removed = {}
+        added = {}
+        for recipe in recipe_ids:
+            row = rows.get(recipe)
+            if row is None:
+                continue
+            for ingredient in ingredients.pop(row, ()):
+                removed.setdefault(int(ingredient), []).append(row)
+            if recipe in loaded:
+                ingredients[row] = np.array(loaded[recipe], dtype=np.int64)
+                for ingredient in loaded[recipe]:
+                    added.setdefault(ingredient, []).append(row)
+            sizes[row] = len(loaded.get(recipe, ()))
+        for ingredient in removed.keys() | added.keys():
+            posting = postings.get(ingredient, np.empty(0, dtype=np.int32))
+            if ingredient in removed:
+                posting = posting[~np.isin(posting, removed[ingredient])]
+            if ingredient in added:
+                new_rows = np.sort(added[ingredient]).astype(np.int32)
+                posting = np.insert(
+                    posting, np.searchsorted(posting, new_rows),
+                    new_rows,
+                )
+            if len(posting):
+                postings[ingredient] = posting
+            else:
+                postings.pop(ingredient, None)
+        self.state = PantryState(
+            np.concatenate((
+                state.recipe_ids, np.array(new_ids, dtype=np.int64),
+            )),
+            rows, sizes, postings, ingredients,
+        )
+
+    def refresh(self):
+        position = get_recipe_changes_position()
+        if position == self.position:
+            return
+        with self.lock:
+            if position == self.position:
+                return
+            if (
+                self.position is None
+                or position < self.position
+                or position - self.position > MAX_PENDING_CHANGES
+            ):
+                self.build(position)
+                return
+            recipe_ids = get_recipe_changes(self.position + 1, position)
+            if recipe_ids == ALL_RECIPES:
+                self.build(position)
+                return
+            self.apply(recipe_ids)
+            self.position = position
+
+    def match(self, ingredients):
+        """Рецепты, в которых есть хотя бы один из ингредиентов.
+
+        Сначала идут рецепты, которые можно приготовить целиком, затем
+        с меньшим числом недостающих, с большим числом совпавших
+        и более новые.
+        """
+
+        self.refresh()
+        state = self.state
+        postings = [
+            state.postings[ingredient] for ingredient in set(ingredients)
+            if ingredient in state.postings
+        ]
+        if not postings:
+            return []
+        counts = np.bincount(
+            np.concatenate(postings), minlength=len(state.sizes),
+        )[:len(state.sizes)]
+        candidates = np.flatnonzero(counts)
+        matched = counts[candidates].astype(np.int64)
+        missing = state.sizes[candidates] - matched
+        return PantryMatches(
+            state.recipe_ids[candidates], missing,
+            (missing << 42) - (matched << 32) - state.recipe_ids[candidates],
+        )
+
+
+pantry_index = PantryIndex()
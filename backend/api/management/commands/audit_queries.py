@@ -0,0 +1,258 @@
+import re
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import EmptyResultSet
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, migrations, models
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+from django.db.models import Count
+
+from api.filters import IngredientFilter
+from api.utils import get_api_request
+from api.views import CustomUserViewSet, RecipeViewSet
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    ShoppingList, Tag,
+)
+from users.models import Subscription
+
+User = get_user_model()
+
+CANDIDATE_INDEXES = (
+    (Recipe, models.Index(
+        fields=('author', '-pub_date', '-id'),
+        name='recipe_author_pub_date_idx',
+    )),
+    (Favorite, models.Index(
+        fields=('user', 'recipe'), name='favorite_user_recipe_idx',
+    )),
+    (ShoppingCart, models.Index(
+        fields=('user', 'recipe'), name='shopping_cart_user_recipe_idx',
+    )),
+    (Subscription, models.Index(
+        fields=('subscriber', 'author'),
+        name='subscription_subscriber_idx',
+    )),
+    (RecipeIngredient, models.Index(
+        fields=('ingredient', 'recipe'),
+        name='recipe_ingredient_ingr_idx',
+    )),
+    (ShoppingList, models.Index(
+        fields=('user', 'ingredient'), name='shopping_list_user_idx',
+    )),
+)
+
+SEQUENTIAL_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)(?! USING (?:COVERING )?INDEX)'),
+}
+SORT = {
+    'postgresql': re.compile(r'\bSort\b'),
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR (?:ORDER|GROUP) BY'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Анализ планов выполнения основных запросов API '
+        'и рекомендации по индексам.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-rows',
+            type=int,
+            default=1000,
+            help='Таблицы с меньшим числом строк не считаются большими.',
+        )
+        parser.add_argument(
+            '--write',
+            action='store_true',
+            help=(
+                'Записать миграцию с индексами в каталог приложения; '
+                'Meta.indexes моделей нужно дополнить вручную.'
+            ),
+        )
+
+    def get_recipe_queryset(self, user, **params):
+        request = get_api_request(user, **params)
+        view = RecipeViewSet(request=request, action='list', kwargs={})
+        queryset = view.filter_queryset(view.get_queryset())
+        return queryset[:settings.REST_FRAMEWORK['PAGE_SIZE']]
+
+    def get_querysets(self):
+        user = User.objects.annotate(
+            favorites=Count('favorite_user'),
+        ).order_by('-favorites').first()
+        if user is None:
+            raise CommandError('В базе данных нет пользователей.')
+        tag = Tag.objects.first()
+        author = Recipe.objects.values_list('author', flat=True).first()
+        subscriptions_request = get_api_request(user, recipes_limit=3)
+        subscriptions_view = CustomUserViewSet(
+            request=subscriptions_request, action='get_subscriptions',
+        )
+        querysets = {
+            'recipes': self.get_recipe_queryset(user),
+            'recipes_author': self.get_recipe_queryset(user, author=author),
+            'recipes_favorited': self.get_recipe_queryset(
+                user, is_favorited=1,
+            ),
+            'recipes_in_shopping_cart': self.get_recipe_queryset(
+                user, is_in_shopping_cart=1,
+            ),
+            'subscriptions': subscriptions_view.get_subscriptions_queryset(
+                subscriptions_request,
+            ),
+            'download_shopping_cart': ShoppingList.objects.for_download(
+                user,
+            ),
+            'shopping_cart_aggregate': ShoppingList.objects.live_totals(
+            ).filter(recipe__shopping_recipe__user=user),
+            'ingredients_prefix': IngredientFilter(
+                {'name': 'са'}, queryset=Ingredient.objects.all(),
+            ).qs,
+        }
+        if tag is not None:
+            querysets['recipes_tag'] = self.get_recipe_queryset(
+                user, tags=tag.slug,
+            )
+        return querysets
+
+    def is_empty(self, queryset):
+        """Пустой ли запрос ещё до обращения к базе данных.
+
+        Для таких запросов, например фильтра по пустому списку
+        идентификаторов, Django не выполняет SQL и explain() не работает.
+        """
+
+        if queryset.query.is_empty():
+            return True
+        try:
+            queryset.query.get_compiler(queryset.db).as_sql()
+        except EmptyResultSet:
+            return True
+        return False
+
+    def get_large_tables(self, min_rows):
+        tables = set()
+        for model, _ in CANDIDATE_INDEXES:
+            if model.objects.count() >= min_rows:
+                tables.add(model._meta.db_table)
+        for model in (Recipe, Ingredient, User):
+            if model.objects.count() >= min_rows:
+                tables.add(model._meta.db_table)
+        return tables
+
+    def analyze(self, plan, large_tables):
+        vendor = connection.vendor
+        scans = set(SEQUENTIAL_SCAN[vendor].findall(plan)) & large_tables
+        tables = {table for table in large_tables if table in plan}
+        has_sort = bool(SORT[vendor].search(plan)) and bool(tables)
+        return scans, has_sort, tables
+
+    def is_missing(self, model, index):
+        columns = [
+            model._meta.get_field(field.lstrip('-')).column
+            for field in index.fields
+        ]
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, model._meta.db_table,
+            )
+        return not any(
+            constraint['columns'][:len(columns)] == columns
+            for constraint in constraints.values()
+            if constraint['index'] or constraint['unique']
+        )
+
+    def get_migrations(self, indexes):
+        loader = MigrationLoader(connection)
+        result = []
+        app_labels = {model._meta.app_label for model, _ in indexes}
+        for app_label in sorted(app_labels):
+            leaf = loader.graph.leaf_nodes(app_label)[0]
+            number = int(leaf[1].split('_')[0]) + 1
+            migration = migrations.Migration(
+                f'{number:04d}_audit_indexes', app_label,
+            )
+            migration.dependencies = [leaf]
+            migration.operations = [
+                migrations.AddIndex(
+                    model_name=model._meta.model_name, index=index,
+                )
+                for model, index in indexes
+                if model._meta.app_label == app_label
+            ]
+            result.append(MigrationWriter(migration))
+        return result
+
+    def get_meta_indexes(self, indexes):
+        """Строки для Meta.indexes моделей с рекомендуемыми индексами."""
+
+        lines = []
+        for model in dict.fromkeys(model for model, _ in indexes):
+            lines.append(f'{model._meta.label}.Meta.indexes:')
+            for index_model, index in indexes:
+                if index_model is model:
+                    lines.append(
+                        f'    models.Index(fields={index.fields!r}, '
+                        f'name={index.name!r}),'
+                    )
+        return '\n'.join(lines)
+
+    def handle(self, *args, **options):
+        if connection.vendor not in SEQUENTIAL_SCAN:
+            raise CommandError(
+                f'База данных {connection.vendor} не поддерживается.'
+            )
+        large_tables = self.get_large_tables(options['min_rows'])
+        flagged_tables = set()
+        for name, queryset in self.get_querysets().items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            if self.is_empty(queryset):
+                self.stdout.write(
+                    'Запрос заведомо пуст и не выполняется базой данных.'
+                )
+                continue
+            plan = queryset.explain()
+            scans, has_sort, tables = self.analyze(plan, large_tables)
+            self.stdout.write(plan)
+            for table in sorted(scans):
+                self.stdout.write(self.style.WARNING(
+                    f'Последовательное чтение большой таблицы {table}.'
+                ))
+            if has_sort:
+                self.stdout.write(self.style.WARNING(
+                    'Сортировка без индекса: '
+                    f'{", ".join(sorted(tables))}.'
+                ))
+            if scans or has_sort:
+                flagged_tables |= scans | tables
+        indexes = [
+            (model, index) for model, index in CANDIDATE_INDEXES
+            if model._meta.db_table in flagged_tables
+            and self.is_missing(model, index)
+        ]
+        if not indexes:
+            self.stdout.write(self.style.SUCCESS(
+                'Недостающих индексов не найдено.'
+            ))
+            return
+        for writer in self.get_migrations(indexes):
+            if options['write']:
+                with open(writer.path, 'w', encoding='utf-8') as file:
+                    file.write(writer.as_string())
+                self.stdout.write(self.style.SUCCESS(
+                    f'Записана миграция {writer.path}.'
+                ))
+            else:
+                self.stdout.write(self.style.MIGRATE_HEADING(writer.path))
+                self.stdout.write(writer.as_string())
+        self.stdout.write(self.style.WARNING(
+            'Добавьте эти индексы в Meta.indexes моделей, иначе следующий '
+            'makemigrations создаст для них RemoveIndex:'
+        ))
+        self.stdout.write(self.get_meta_indexes(indexes))
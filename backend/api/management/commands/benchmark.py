@@ -0,0 +1,199 @@
+import json
+import platform
+import statistics
+import time
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+
+from api.filters import IngredientFilter
+from api.indexes import pantry_index
+from api.renderers import TextShoppingCartRenderer
+from api.serializers import GetRecipeSerializer, SubscriptionShowSerializer
+from api.utils import get_api_request
+from api.views import CustomUserViewSet, RecipeViewSet
+from recipes.models import Ingredient, Recipe, ShoppingList, Tag
+
+User = get_user_model()
+
+RECIPE_PAGE_SIZES = (6, 50, 500)
+INGREDIENT_PREFIXES = ('а', 'мо', 'сах', 'кар')
+PANTRY_SIZE = 20
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеры времени сериализаторов, фильтров и агрегации '
+        'списка покупок с записью результатов в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Количество повторов каждого замера.',
+        )
+        parser.add_argument(
+            '--output',
+            help='Файл для записи результатов в формате JSON.',
+        )
+        parser.add_argument(
+            '--compare',
+            help='Файл с результатами предыдущего запуска для сравнения.',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.2,
+            help='Допустимое относительное замедление при сравнении.',
+        )
+
+    def get_user(self):
+        user = User.objects.annotate(
+            favorites=Count('favorite_user'),
+            cart=Count('shopping_user'),
+        ).order_by('-favorites', '-cart', 'id').first()
+        if user is None:
+            raise CommandError('В базе данных нет пользователей.')
+        return user
+
+    def serialize_recipes(self, request, size):
+        recipes = Recipe.objects.with_related(request.user)[:size]
+        return GetRecipeSerializer(
+            recipes, many=True, context={'request': request},
+        ).data
+
+    def serialize_subscriptions(self, request):
+        view = CustomUserViewSet(request=request, action='get_subscriptions')
+        authors = view.get_subscriptions_queryset(request)[:6]
+        return SubscriptionShowSerializer(
+            authors, many=True, context={'request': request},
+        ).data
+
+    def filter_recipes(self, request):
+        view = RecipeViewSet(request=request, action='list', kwargs={})
+        return list(view.filter_queryset(view.get_queryset())[:6])
+
+    def filter_ingredients(self):
+        for prefix in INGREDIENT_PREFIXES:
+            list(IngredientFilter(
+                {'name': prefix}, queryset=Ingredient.objects.all(),
+            ).qs)
+
+    def download_shopping_cart(self, user):
+        return ''.join(TextShoppingCartRenderer().stream(
+            ShoppingList.objects.for_download(user).iterator(),
+        ))
+
+    def get_cases(self):
+        user = self.get_user()
+        tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+        cases = {
+            f'recipe_serializer_{size}': (
+                lambda size=size: self.serialize_recipes(
+                    get_api_request(user), size,
+                )
+            )
+            for size in RECIPE_PAGE_SIZES
+        }
+        cases['subscription_serializer'] = (
+            lambda: self.serialize_subscriptions(
+                get_api_request(user, recipes_limit=3),
+            )
+        )
+        filters = {
+            'recipe_filter_tags': {'tags': tags},
+            'recipe_filter_favorited': {'is_favorited': 1},
+            'recipe_filter_tags_favorited': {
+                'tags': tags, 'is_favorited': 1,
+            },
+            'recipe_filter_in_shopping_cart': {'is_in_shopping_cart': 1},
+        }
+        for name, params in filters.items():
+            cases[name] = (
+                lambda params=params: self.filter_recipes(
+                    get_api_request(user, **params),
+                )
+            )
+        cases['ingredient_filter_prefix'] = self.filter_ingredients
+        pantry = list(Ingredient.objects.annotate(
+            usage=Count('recipeingredient'),
+        ).order_by('-usage', 'id').values_list('id', flat=True)[
+            :PANTRY_SIZE
+        ])
+        cases['pantry_match'] = lambda: pantry_index.match(pantry)[:6]
+        cases['download_shopping_cart'] = (
+            lambda: self.download_shopping_cart(user)
+        )
+        return cases
+
+    def measure(self, function, repeat):
+        function()
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                function()
+                timings.append((time.perf_counter() - started) * 1000)
+        return {
+            'median_ms': round(statistics.median(timings), 3),
+            'min_ms': round(min(timings), 3),
+            'queries': len(queries),
+        }
+
+    def compare(self, results, path, threshold):
+        try:
+            with open(path, encoding='utf-8') as file:
+                baseline = json.load(file)['results']
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+        regressions = []
+        for name, result in results.items():
+            previous = baseline.get(name)
+            if previous is None:
+                continue
+            change = result['median_ms'] / previous['median_ms'] - 1
+            self.stdout.write(
+                f'{name}: {previous["median_ms"]:.3f} -> '
+                f'{result["median_ms"]:.3f} мс ({change:+.1%}), '
+                f'запросов {previous["queries"]} -> {result["queries"]}'
+            )
+            if change > threshold or result['queries'] > previous['queries']:
+                regressions.append(name)
+        return regressions
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError(
+                'Количество повторов должно быть положительным.'
+            )
+        results = {}
+        for name, function in self.get_cases().items():
+            results[name] = self.measure(function, options['repeat'])
+            self.stdout.write(
+                f'{name}: {results[name]["median_ms"]:.3f} мс, '
+                f'запросов {results[name]["queries"]}'
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({
+                    'database': connection.vendor,
+                    'django': django.get_version(),
+                    'python': platform.python_version(),
+                    'repeat': options['repeat'],
+                    'results': results,
+                }, file, ensure_ascii=False, indent=2)
+        if options['compare']:
+            regressions = self.compare(
+                results, options['compare'], options['threshold'],
+            )
+            if regressions:
+                raise CommandError(
+                    f'Замедление: {", ".join(regressions)}.'
+                )
+            self.stdout.write(self.style.SUCCESS('Замедлений не найдено.'))
@@ -0,0 +1,141 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('api.performance')
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class RequestMetrics:
+    """Время и запросы к базе данных в рамках одного запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_time = 0.0
+        self.queries = Counter()
+        self.timings = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries[(sql, str(params))] += 1
+
+    @contextmanager
+    def timer(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - started
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    @property
+    def duplicate_count(self):
+        return sum(count - 1 for count in self.queries.values())
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+    def get_server_timing(self):
+        parts = [
+            f'db;dur={self.db_time * 1000:.1f};'
+            f'desc="{self.query_count} queries, '
+            f'{self.duplicate_count} duplicates"',
+        ]
+        parts.extend(
+            f'{name};dur={duration * 1000:.1f}'
+            for name, duration in self.timings.items()
+        )
+        parts.append(f'total;dur={self.total_time * 1000:.1f}')
+        return ', '.join(parts)
+
+    def as_dict(self, request, response):
+        return {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'total_ms': round(self.total_time * 1000, 1),
+            'db_ms': round(self.db_time * 1000, 1),
+            'queries': self.query_count,
+            'duplicates': self.duplicate_count,
+            **{
+                f'{name}_ms': round(duration * 1000, 1)
+                for name, duration in self.timings.items()
+            },
+        }
+
+
+def track_serializer(serializer):
+    """Учитывает время сериализации, если сбор метрик включён."""
+
+    metrics = current_metrics.get()
+    if metrics is None:
+        return serializer
+    to_representation = serializer.to_representation
+
+    def timed_to_representation(instance):
+        with metrics.timer('serializer'):
+            return to_representation(instance)
+
+    serializer.to_representation = timed_to_representation
+    return serializer
+
+
+class PerformanceMiddleware:
+    """Метрики производительности запроса.
+
+    Количество и время SQL-запросов, повторяющиеся запросы, время
+    сериализации и рендеринга отдаются в заголовке Server-Timing,
+    а медленные запросы записываются в журнал одной строкой JSON.
+    При выключенной настройке PERFORMANCE_MONITORING
+    промежуточный слой не подключается.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PERFORMANCE_MONITORING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        response['Server-Timing'] = metrics.get_server_timing()
+        if metrics.total_time * 1000 >= settings.SLOW_REQUEST_THRESHOLD:
+            logger.warning(json.dumps(
+                metrics.as_dict(request, response), ensure_ascii=False,
+            ))
+        return response
+
+    def process_template_response(self, request, response):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return response
+        started = time.perf_counter()
+
+        def add_render_time(response):
+            metrics.timings['render'] += time.perf_counter() - started
+
+        response.add_post_render_callback(add_render_time)
+        return response
@@ -0,0 +1,107 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag, urlencode
+from rest_framework import permissions, response
+
+from recipes.cache import CONTENT_VERSION_KEY, get_version
+from .middleware import track_serializer
+
+
+class ConditionalCatalogMixin:
+    """Условные GET-запросы для справочников.
+
+    ETag и Last-Modified вычисляются по версии справочника из кэша,
+    поэтому ответ 304 отдаётся без обращения к базе данных.
+    """
+
+    catalog_version_key = None
+
+    def get_catalog_headers(self, request):
+        version = get_version(self.catalog_version_key)
+        etag = md5(
+            f'{version}:{request.accepted_renderer.format}:'
+            f'{request.get_full_path()}'.encode()
+        ).hexdigest()
+        return quote_etag(etag), int(version)
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        etag, last_modified = self.get_catalog_headers(request)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified,
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(
+                response, public=True,
+                max_age=settings.CATALOG_CACHE_MAX_AGE,
+            )
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs,
+        )
+
+
+class AnonymousResponseCacheMixin:
+    """Кэш ответов списка и детальной страницы для анонимных запросов.
+
+    Ключ включает глобальную версию контента, которая меняется при любом
+    изменении рецептов, ингредиентов, тэгов и авторов, поэтому устаревшие
+    ответы не используются и их не нужно удалять. Счётчики избранного,
+    корзин и подписчиков версию не меняют и в ответах отстают не дольше
+    RESPONSE_CACHE_TIMEOUT.
+    """
+
+    def get_response_cache_key(self, request):
+        query = urlencode(sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+        ), doseq=True)
+        return 'response:{}:{}'.format(
+            get_version(CONTENT_VERSION_KEY),
+            md5(
+                f'{request.get_host()}:{request.path}?{query}'.encode()
+            ).hexdigest(),
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if (
+            request.method not in permissions.SAFE_METHODS
+            or request.user.is_authenticated
+        ):
+            return handler(request, *args, **kwargs)
+        key = self.get_response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return response.Response(data)
+        result = handler(request, *args, **kwargs)
+        if result.status_code == 200:
+            cache.set(key, result.data, settings.RESPONSE_CACHE_TIMEOUT)
+        return result
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs,
+        )
+
+
+class SerializerTimingMixin:
+    """Учёт времени сериализации в метриках запроса."""
+
+    def get_serializer(self, *args, **kwargs):
+        return track_serializer(super().get_serializer(*args, **kwargs))
@@ -1,6 +1,64 @@
 from rest_framework import pagination
+from rest_framework.exceptions import ValidationError
+
+
+class CustomCursorPagination(pagination.CursorPagination):
+    """Пагинация по ключу для постраничного режима cursor.
+
+    Порядок всегда берётся из cursor_ordering представления: позиция
+    курсора строится по первому полю порядка, и по неуникальному полю,
+    например счётчику, страницы бы повторялись.
+    """
+
+    page_size_query_param = 'limit'
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering
 
 
 class CustomPagePagination(pagination.PageNumberPagination):
+    """Постраничная пагинация с включаемым режимом курсора.
+
+    Параметр pagination=cursor переключает представления, у которых
+    задан атрибут cursor_ordering, на пагинацию по ключу: вместо
+    COUNT и OFFSET выбираются записи после позиции из параметра cursor.
+    Параметры из cursor_excluded_params представления (поиск
+    с сортировкой по релевантности, сортировка по счётчикам) с этим
+    режимом несовместимы.
+    """
 
     page_size_query_param = 'limit'
+    mode_query_param = 'pagination'
+    cursor_mode = 'cursor'
+    cursor_pagination_class = CustomCursorPagination
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = getattr(view, 'cursor_ordering', None)
+        mode = request.query_params.get(self.mode_query_param)
+        if ordering and mode == self.cursor_mode:
+            excluded = [
+                param for param in getattr(view, 'cursor_excluded_params', ())
+                if param in request.query_params
+            ]
+            if excluded:
+                raise ValidationError({
+                    self.mode_query_param: [
+                        'Пагинация по ключу недоступна вместе с '
+                        f'параметрами: {", ".join(excluded)}.'
+                    ],
+                })
+            self.cursor_paginator = self.cursor_pagination_class()
+            self.cursor_paginator.ordering = ordering
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view,
+            )
+        self.cursor_paginator = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
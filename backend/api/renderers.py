@@ -0,0 +1,118 @@
+import csv
+import io
+import os
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework import renderers
+
+SHOPPING_CART_TITLE = 'Продуктовая корзина:'
+
+
+class ShoppingCartRenderer(renderers.BaseRenderer):
+    """Базовый рендерер списка покупок.
+
+    Файл отдаётся потоково: метод stream принимает итератор строк
+    агрегата ингредиентов и возвращает генератор частей файла.
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = data.get('detail', data)
+        return str(data).encode('utf-8')
+
+    def stream(self, ingredients):
+        raise NotImplementedError
+
+    @staticmethod
+    def get_row(ingredient):
+        return (
+            ingredient['ingredient__name'].capitalize(),
+            ingredient['total_amount'],
+            ingredient['ingredient__measurement_unit'],
+        )
+
+
+class TextShoppingCartRenderer(ShoppingCartRenderer):
+    """Список покупок в текстовом формате."""
+
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, ingredients):
+        yield f'{SHOPPING_CART_TITLE}\n'
+        for num, ingredient in enumerate(ingredients, 1):
+            name, amount, unit = self.get_row(ingredient)
+            yield f'{num}. {name} - {amount} {unit}.\n'
+
+
+class CsvShoppingCartRenderer(ShoppingCartRenderer):
+    """Список покупок в формате CSV."""
+
+    media_type = 'text/csv'
+    format = 'csv'
+
+    class Echo:
+        """Псевдобуфер, возвращающий записанную строку."""
+
+        def write(self, value):
+            return value
+
+    def stream(self, ingredients):
+        writer = csv.writer(self.Echo())
+        yield writer.writerow(('Ингредиент', 'Количество', 'Единица'))
+        for ingredient in ingredients:
+            yield writer.writerow(self.get_row(ingredient))
+
+
+class PdfShoppingCartRenderer(ShoppingCartRenderer):
+    """Список покупок в формате PDF.
+
+    PDF-документ собирается целиком, так как таблица ссылок пишется
+    в конец файла. Его размер ограничен числом различных ингредиентов,
+    а не количеством рецептов в корзине.
+    """
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_name = 'ShoppingCartFont'
+    font_size = 12
+    margin = 50
+    line_height = 18
+
+    def get_font(self):
+        if self.font_name in pdfmetrics.getRegisteredFontNames():
+            return self.font_name
+        if os.path.exists(settings.PDF_FONT_PATH):
+            pdfmetrics.registerFont(
+                TTFont(self.font_name, settings.PDF_FONT_PATH)
+            )
+            return self.font_name
+        return 'Helvetica'
+
+    def stream(self, ingredients):
+        buffer = io.BytesIO()
+        font = self.get_font()
+        width, height = A4
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        pdf.setFont(font, self.font_size)
+        y = height - self.margin
+        pdf.drawString(self.margin, y, SHOPPING_CART_TITLE)
+        for num, ingredient in enumerate(ingredients, 1):
+            y -= self.line_height
+            if y < self.margin:
+                pdf.showPage()
+                pdf.setFont(font, self.font_size)
+                y = height - self.margin
+            name, amount, unit = self.get_row(ingredient)
+            pdf.drawString(
+                self.margin, y, f'{num}. {name} - {amount} {unit}.'
+            )
+        pdf.save()
+        yield buffer.getvalue()
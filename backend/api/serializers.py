@@ -1,17 +1,41 @@
 from drf_extra_fields.fields import Base64ImageField
 from djoser.serializers import UserSerializer
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from rest_framework import serializers, validators
 
+from recipes.cache import get_recipe_ids
+from recipes.images import get_variant_urls
 from recipes.models import (
     Favorite, Ingredient, Recipe,
-    RecipeIngredient, ShoppingCart, Tag,
+    RecipeIngredient, ShoppingCart, ShoppingList, Tag,
 )
+from recipes.similarity import queue_similarity_updates
 from users.models import Subscription
 
 User = get_user_model()
 
 
+class ImageVariantsField(serializers.Field):
+    """Адреса уменьшенных и WebP-вариантов изображения рецепта."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        kwargs.setdefault('source', 'image')
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        urls = get_variant_urls(value)
+        request = self.context.get('request')
+        if request is None:
+            return urls
+        return {
+            variant: request.build_absolute_uri(url)
+            for variant, url in urls.items()
+        }
+
+
 class CustomUserSerializer(UserSerializer):
     """Сериализатор для модели MyCustomUser."""
 
@@ -26,9 +50,13 @@ class CustomUserSerializer(UserSerializer):
             'first_name',
             'last_name',
             'is_subscribed',
+            'recipes_count',
+            'subscribers_count',
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
@@ -65,12 +93,13 @@ class RecipeShowSerializer(serializers.ModelSerializer):
     """Сериализатор для отображения рецептов."""
 
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'name',
-            'image', 'cooking_time',
+            'image', 'image_variants', 'cooking_time',
         )
 
 
@@ -78,7 +107,6 @@ class SubscriptionShowSerializer(CustomUserSerializer):
     """Сериализатор для подписок."""
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -86,22 +114,22 @@ class SubscriptionShowSerializer(CustomUserSerializer):
             'id', 'email', 'username',
             'first_name', 'last_name',
             'is_subscribed', 'recipes',
-            'recipes_count',
+            'recipes_count', 'subscribers_count',
         )
 
     def get_recipes(self, obj):
-        recipes = obj.recipes.all()
-        request = self.context.get('request')
-        recipes_limit = request.GET.get('recipes_limit')
-        if recipes_limit:
-            recipes = obj.recipes.all()[:int(recipes_limit)]
+        if hasattr(obj, 'shown_recipes'):
+            recipes = obj.shown_recipes
+        else:
+            recipes = obj.recipes.all()
+            request = self.context.get('request')
+            recipes_limit = request.GET.get('recipes_limit')
+            if recipes_limit:
+                recipes = obj.recipes.all()[:int(recipes_limit)]
         return RecipeShowSerializer(
             recipes, many=True,
         ).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
 
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор для модели Tag."""
@@ -146,9 +174,7 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
 class CreateRecipeIngredientSerializer(serializers.ModelSerializer):
     """Сериализатор для модели RecipeIngredient."""
 
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
-    )
+    id = serializers.IntegerField(min_value=1)
     amount = serializers.IntegerField()
 
     class Meta:
@@ -164,6 +190,7 @@ class GetRecipeSerializer(serializers.ModelSerializer):
     author = CustomUserSerializer(read_only=True)
     tags = TagSerializer(read_only=True, many=True)
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
     ingredients = RecipeIngredientSerializer(
         source='recipe_ingredient', read_only=True, many=True
     )
@@ -175,20 +202,26 @@ class GetRecipeSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'tags', 'author', 'ingredients',
             'is_favorited', 'is_in_shopping_cart', 'name',
-            'image', 'text', 'cooking_time',
+            'image', 'image_variants', 'text', 'cooking_time',
+            'favorites_count', 'shopping_cart_count',
         )
 
-    def get_is_favorited(self, obj):
+    def get_user_recipe_ids(self, model):
+        """Рецепты пользователя из кэша, один раз на запрос."""
+
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
-            return False
-        return request.user.favorite_user.filter(recipe=obj).exists()
+            return frozenset()
+        key = f'{model._meta.model_name}_ids'
+        if key not in self.context:
+            self.context[key] = get_recipe_ids(model, request.user.id)
+        return self.context[key]
+
+    def get_is_favorited(self, obj):
+        return obj.id in self.get_user_recipe_ids(Favorite)
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
-            return False
-        return request.user.shopping_user.filter(recipe=obj).exists()
+        return obj.id in self.get_user_recipe_ids(ShoppingCart)
 
 
 class CreateRecipeSerializer(serializers.ModelSerializer):
@@ -196,8 +229,8 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
 
     image = Base64ImageField(required=True)
     ingredients = CreateRecipeIngredientSerializer(many=True, required=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True, required=True,
+    tags = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=True,
     )
     author = CustomUserSerializer(read_only=True)
 
@@ -221,6 +254,7 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         ]
         RecipeIngredient.objects.bulk_create(result_list)
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
@@ -228,18 +262,76 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         self.create_tags_ingredients(
             recipe=recipe, ingredients=ingredients, tags=tags,
         )
+        queue_similarity_updates([recipe.pk])
         return recipe
 
+    def update_ingredients(self, recipe, ingredients):
+        """Применяет к ингредиентам рецепта только изменения.
+
+        Возвращает разницу количеств по ингредиентам для списков покупок;
+        удалённые ингредиенты из списков вычитает сигнал pre_delete.
+        """
+
+        existing = {
+            item.ingredient_id: item
+            for item in RecipeIngredient.objects.filter(recipe=recipe)
+        }
+        submitted = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        deltas = {}
+        to_create = []
+        to_update = []
+        for ingredient, amount in submitted.items():
+            item = existing.get(ingredient)
+            if item is None:
+                to_create.append(RecipeIngredient(
+                    recipe=recipe, ingredient_id=ingredient, amount=amount,
+                ))
+                deltas[ingredient] = amount
+            elif item.amount != amount:
+                deltas[ingredient] = amount - item.amount
+                item.amount = amount
+                to_update.append(item)
+        to_delete = existing.keys() - submitted.keys()
+        if to_delete:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient__in=to_delete,
+            ).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ('amount',))
+        if to_create:
+            RecipeIngredient.objects.bulk_create(to_create)
+        return deltas
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
+        features = self.get_features(instance)
         instance = super().update(instance, validated_data)
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        self.create_tags_ingredients(
-            recipe=instance, ingredients=ingredients, tags=tags,
-        )
+        instance.tags.set(tags)
+        deltas = self.update_ingredients(instance, ingredients)
+        if deltas:
+            ShoppingList.objects.change_recipe_amounts(instance, deltas)
+        if features != (
+            {tag.pk for tag in tags},
+            {ingredient['id'].pk for ingredient in ingredients},
+        ):
+            queue_similarity_updates([instance.pk])
         return instance
 
+    def get_features(self, recipe):
+        """Тэги и ингредиенты рецепта, от которых зависит сходство."""
+
+        return (
+            set(recipe.tags.values_list('pk', flat=True)),
+            set(recipe.recipe_ingredient.values_list(
+                'ingredient_id', flat=True,
+            )),
+        )
+
     def validate_image(self, value):
         if not value:
             raise serializers.ValidationError(
@@ -247,12 +339,33 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             )
         return value
 
+    def get_objects(self, model, pks):
+        """Объекты по идентификаторам одним запросом.
+
+        Для неизвестных идентификаторов возвращаются ошибки
+        по позициям элементов списка.
+        """
+
+        objects = model.objects.in_bulk(set(pks))
+        message = serializers.PrimaryKeyRelatedField.default_error_messages[
+            'does_not_exist'
+        ]
+        errors = {
+            index: [message.format(pk_value=pk)]
+            for index, pk in enumerate(pks)
+            if pk not in objects
+        }
+        return objects, errors
+
     def validate_tags(self, value):
         if not value:
             raise serializers.ValidationError(
                 'Поле тэгов не заполнено!'
             )
-        return value
+        tags, errors = self.get_objects(Tag, value)
+        if errors:
+            raise serializers.ValidationError(errors)
+        return [tags[pk] for pk in dict.fromkeys(value)]
 
     def validate_ingredients(self, value):
         ingredients = [
@@ -266,9 +379,18 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Поле ингредиентов не заполнено!'
             )
+        objects, errors = self.get_objects(Ingredient, ingredients)
+        if errors:
+            raise serializers.ValidationError([
+                {'id': errors[index]} if index in errors else {}
+                for index in range(len(value))
+            ])
+        for ingredient in value:
+            ingredient['id'] = objects[ingredient['id']]
         return value
 
     def to_representation(self, instance):
+        instance = Recipe.objects.with_related().get(pk=instance.pk)
         return GetRecipeSerializer(instance).data
 
 
@@ -300,3 +422,32 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
                 message='Рецепт уже добавлен в cписок покупок.',
             ),
         ]
+
+
+class BatchIdsSerializer(serializers.Serializer):
+    """Сериализатор списка идентификаторов для пакетных операций."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BATCH_MAX_SIZE,
+    )
+
+
+class PantrySerializer(serializers.Serializer):
+    """Сериализатор ингредиентов, которые есть у пользователя."""
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.PANTRY_MAX_INGREDIENTS,
+    )
+
+
+class PantryRecipeSerializer(GetRecipeSerializer):
+    """Сериализатор рецептов с количеством недостающих ингредиентов."""
+
+    missing_ingredients = serializers.IntegerField(read_only=True)
+
+    class Meta(GetRecipeSerializer.Meta):
+        fields = GetRecipeSerializer.Meta.fields + ('missing_ingredients',)
@@ -1,13 +1,26 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.http import HttpResponseBadRequest
 from django.shortcuts import get_object_or_404
 from rest_framework import status, response
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
 
-from recipes.models import Recipe
-from .serializers import RecipeShowSerializer
+from recipes.cache import refresh_recipe_ids
+from recipes.counters import change_counter
+from recipes.models import Favorite, Recipe, ShoppingCart, ShoppingList
+from users.models import Subscription
+from .serializers import BatchIdsSerializer, RecipeShowSerializer
 
 User = get_user_model()
 
+BATCH_FIELDS = {
+    Favorite: ('user', 'recipe'),
+    ShoppingCart: ('user', 'recipe'),
+    Subscription: ('subscriber', 'author'),
+}
+
 
 def create_post(model_serializer=None, request=None, id=None):
 
@@ -15,11 +28,14 @@ def create_post(model_serializer=None, request=None, id=None):
         recipe = Recipe.objects.get(id=id)
     except Recipe.DoesNotExist:
         return HttpResponseBadRequest('Рецепт ещё не создан.')
-    user = get_object_or_404(User, id=request.user.id)
+    user = request.user
     data = {'user': user.id, 'recipe': recipe.id}
     serializer = model_serializer(data=data)
     serializer.is_valid(raise_exception=True)
-    serializer.save()
+    model = model_serializer.Meta.model
+    with transaction.atomic():
+        serializer.save()
+        transaction.on_commit(lambda: refresh_recipe_ids(model, user.id))
     result_serializer = RecipeShowSerializer(recipe)
     return response.Response(
         result_serializer.data, status=status.HTTP_201_CREATED
@@ -38,5 +54,115 @@ def delete_post(obj=None, request=None, id=None):
         return HttpResponseBadRequest(
             'У вас еще нет этого рецепта.'
         )
-    obj_result.delete()
+    with transaction.atomic():
+        obj_result.delete()
+        transaction.on_commit(
+            lambda: refresh_recipe_ids(obj, request.user.id)
+        )
     return response.Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def get_batch_ids(request):
+    serializer = BatchIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    return list(dict.fromkeys(serializer.validated_data['ids']))
+
+
+def lock_user(user):
+    """Блокирует строку пользователя до конца транзакции.
+
+    Пакетные операции одного пользователя выполняются по очереди,
+    поэтому сводный список покупок не получает двойных добавлений.
+    """
+
+    list(User.objects.select_for_update().filter(
+        pk=user.pk,
+    ).values_list('pk', flat=True))
+
+
+def batch_response(ids, statuses):
+    return response.Response({
+        'results': [{'id': id, 'status': statuses[id]} for id in ids],
+    })
+
+
+def create_batch(model, request):
+    """Пакетное добавление в избранное, корзину или подписки.
+
+    Количество запросов не зависит от числа идентификаторов.
+    """
+
+    user_field, target_field = BATCH_FIELDS[model]
+    target_model = model._meta.get_field(target_field).related_model
+    ids = get_batch_ids(request)
+    user = request.user
+    with transaction.atomic():
+        lock_user(user)
+        found = set(target_model.objects.filter(
+            pk__in=ids,
+        ).values_list('pk', flat=True))
+        existing = set(model.objects.filter(**{
+            user_field: user, f'{target_field}__in': found,
+        }).values_list(target_field, flat=True))
+        statuses = {}
+        for id in ids:
+            if id not in found:
+                statuses[id] = 'not_found'
+            elif model is Subscription and id == user.id:
+                statuses[id] = 'self'
+            elif id in existing:
+                statuses[id] = 'exists'
+            else:
+                statuses[id] = 'created'
+        created = [id for id in ids if statuses[id] == 'created']
+        if created:
+            model.objects.bulk_create(
+                [
+                    model(**{user_field: user, f'{target_field}_id': id})
+                    for id in created
+                ],
+                ignore_conflicts=True,
+            )
+            change_counter(model, created, 1)
+            if model is ShoppingCart:
+                ShoppingList.objects.add_recipes([user.id], created)
+            if model is not Subscription:
+                transaction.on_commit(
+                    lambda: refresh_recipe_ids(model, user.id)
+                )
+    return batch_response(ids, statuses)
+
+
+def delete_batch(model, request):
+    """Пакетное удаление из избранного, корзины или подписок.
+
+    Счётчики и списки покупок обновляют сигналы pre_delete одной пачкой.
+    """
+
+    user_field, target_field = BATCH_FIELDS[model]
+    ids = get_batch_ids(request)
+    user = request.user
+    with transaction.atomic():
+        lock_user(user)
+        objects = model.objects.filter(**{
+            user_field: user, f'{target_field}__in': ids,
+        })
+        existing = set(objects.values_list(target_field, flat=True))
+        if existing:
+            objects.delete()
+            if model is not Subscription:
+                transaction.on_commit(
+                    lambda: refresh_recipe_ids(model, user.id)
+                )
+    return batch_response(ids, {
+        id: 'deleted' if id in existing else 'not_found' for id in ids
+    })
+
+
+def get_api_request(user, **params):
+    """GET-запрос к API от имени пользователя для служебных команд."""
+
+    host = settings.ALLOWED_HOSTS[0].lstrip('.*') or 'localhost'
+    request = Request(APIRequestFactory().get('/', params, HTTP_HOST=host))
+    request.user = user
+    return request
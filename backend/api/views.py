@@ -1,34 +1,77 @@
+from itertools import chain
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse, HttpResponseBadRequest
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import decorators, permissions, status, viewsets, response
 
+from recipes.cache import INGREDIENTS_VERSION_KEY, TAGS_VERSION_KEY
 from recipes.models import (
-    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Tag,
+    Favorite, Ingredient, Recipe, ShoppingCart, ShoppingList, Tag,
 )
+from recipes.similarity import queue_similarity_updates
 from users.models import Subscription
-from .filters import IngredientFilter, RecipeFilter
+from .filters import IngredientFilter, RecipeFilter, StableOrderingFilter
+from .indexes import ingredient_index, pantry_index
+from .middleware import track_serializer
+from .mixins import (
+    AnonymousResponseCacheMixin, ConditionalCatalogMixin,
+    SerializerTimingMixin,
+)
 from .permissions import IsAuthorOrReadOnly
+from .renderers import (
+    CsvShoppingCartRenderer, PdfShoppingCartRenderer,
+    TextShoppingCartRenderer,
+)
 from .serializers import (
     CreateRecipeSerializer, FavoriteSerializer, GetRecipeSerializer,
-    IngredientSerializer, CustomUserSerializer, ShoppingCartSerializer,
-    SubscriptionSerializer, SubscriptionShowSerializer, TagSerializer,
+    IngredientSerializer, CustomUserSerializer, PantryRecipeSerializer,
+    PantrySerializer, ShoppingCartSerializer, SubscriptionSerializer,
+    SubscriptionShowSerializer, TagSerializer,
 )
-from .utils import create_post, delete_post
+from .utils import create_batch, create_post, delete_batch, delete_post
 
 User = get_user_model()
 
 
-class CustomUserViewSet(UserViewSet):
+class CustomUserViewSet(SerializerTimingMixin, UserViewSet):
     """Вьюсет пользователя."""
 
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly, )
     lookup_url_kwarg = 'id'
+    cursor_ordering = ('id',)
+    cursor_excluded_params = ('ordering',)
+    filter_backends = (StableOrderingFilter, )
+    ordering_fields = ('recipes_count', 'subscribers_count')
+
+    def get_subscriptions_queryset(self, request):
+        """Авторы, на которых подписан пользователь, с их рецептами.
+
+        Количество рецептов хранится в счётчике автора, а ограничение
+        recipes_limit применяется в базе данных оконной функцией
+        внутри одной предвыборки.
+        """
+
+        recipes = Recipe.objects.all()
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit():
+            recipes = recipes[:int(recipes_limit)]
+        return User.objects.filter(
+            author__subscriber=request.user,
+        ).with_is_subscribed(
+            request.user,
+        ).order_by(
+            'id',
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='shown_recipes'),
+        )
 
     @decorators.action(
         detail=False,
@@ -40,12 +83,14 @@ class CustomUserViewSet(UserViewSet):
     def get_subscriptions(self, request):
         """Список подписок."""
 
-        authors = User.objects.filter(author__subscriber=request.user)
+        authors = self.filter_queryset(
+            self.get_subscriptions_queryset(request),
+        )
         result_pages = self.paginate_queryset(queryset=authors,)
         context = {'request': request}
-        serializer = SubscriptionShowSerializer(
+        serializer = track_serializer(SubscriptionShowSerializer(
             result_pages, context=context, many=True,
-        )
+        ))
         return self.get_paginated_response(serializer.data)
 
     @decorators.action(
@@ -62,7 +107,8 @@ class CustomUserViewSet(UserViewSet):
         data = {'subscriber': request.user.id, 'author': author.id}
         serializer = SubscriptionSerializer(data=data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
         context = {'request': request}
         result_serializer = SubscriptionShowSerializer(
             author, context=context,
@@ -83,27 +129,54 @@ class CustomUserViewSet(UserViewSet):
             return HttpResponseBadRequest(
                 'Вы еще не подписаны на этого пользователя.'
             )
-        subscription.delete()
+        with transaction.atomic():
+            subscription.delete()
         return response.Response(status=status.HTTP_204_NO_CONTENT)
 
+    @decorators.action(
+        detail=False,
+        methods=['post'],
+        url_path='subscribe',
+        url_name='subscribe-batch',
+        permission_classes=(permissions.IsAuthenticated, ),
+    )
+    def post_subscribe_batch(self, request):
+        """Пакетное оформление подписок."""
+
+        return create_batch(Subscription, request)
+
+    @post_subscribe_batch.mapping.delete
+    def delete_subscribe_batch(self, request):
+        """Пакетное удаление подписок."""
+
+        return delete_batch(Subscription, request)
+
     def get_permissions(self):
         if self.action == 'me':
             return (permissions.IsAuthenticated(), )
         return super().get_permissions()
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(
+    SerializerTimingMixin, ConditionalCatalogMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
     """Вьюсет для тэгов."""
 
+    catalog_version_key = TAGS_VERSION_KEY
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (permissions.AllowAny, )
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(
+    SerializerTimingMixin, ConditionalCatalogMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
     """Вьюсет для ингредиентов."""
 
+    catalog_version_key = INGREDIENTS_VERSION_KEY
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (permissions.AllowAny, )
@@ -111,17 +184,51 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend, )
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('name'):
+            return self.conditional_response(
+                self.search, request, *args, **kwargs,
+            )
+        return super().list(request, *args, **kwargs)
+
+    def search(self, request, *args, **kwargs):
+        """Поиск ингредиентов по индексу в памяти."""
+
+        return response.Response(
+            ingredient_index.search(
+                request.query_params['name'],
+                settings.INGREDIENTS_SEARCH_LIMIT,
+            )
+        )
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    SerializerTimingMixin, AnonymousResponseCacheMixin,
+    viewsets.ModelViewSet,
+):
     """Вьюсет для рецептов."""
 
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly, )
-    filter_backends = (DjangoFilterBackend, )
+    filter_backends = (DjangoFilterBackend, StableOrderingFilter)
     filterset_class = RecipeFilter
+    ordering_fields = ('pub_date', 'favorites_count', 'shopping_cart_count')
     lookup_url_kwarg = 'id'
+    cursor_ordering = ('-pub_date', '-id')
+    cursor_excluded_params = ('search', 'ordering')
+
+    def get_queryset(self):
+        if self.action == 'get_feed':
+            return Recipe.objects.feed(
+                self.request.user,
+            ).with_related(self.request.user)
+        if self.request.method in permissions.SAFE_METHODS:
+            return Recipe.objects.with_related(self.request.user)
+        return super().get_queryset()
 
     def get_serializer_class(self):
+        if self.action == 'get_pantry':
+            return PantryRecipeSerializer
         if self.request.method in permissions.SAFE_METHODS:
             return GetRecipeSerializer
         return CreateRecipeSerializer
@@ -129,6 +236,93 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        similar_to = list(
+            instance.similar_to.values_list('recipe', flat=True)
+        )
+        instance.delete()
+        queue_similarity_updates(similar_to, features_changed=False)
+
+    @decorators.action(
+        detail=False,
+        methods=['get'],
+        url_path='feed',
+        url_name='feed',
+        permission_classes=(permissions.IsAuthenticated, ),
+    )
+    def get_feed(self, request):
+        """Лента рецептов авторов, на которых подписан пользователь.
+
+        Подписки подставляются подзапросом IN, а порядок по дате
+        публикации поддерживается индексом (author, -pub_date, -id).
+        Поддерживает те же фильтры и пагинацию, что и список рецептов.
+        """
+
+        return self.list(request)
+
+    @decorators.action(
+        detail=False,
+        methods=['get'],
+        url_path='pantry',
+        url_name='pantry',
+    )
+    def get_pantry(self, request):
+        """Рецепты из ингредиентов, которые есть у пользователя.
+
+        Ингредиенты передаются параметрами ingredients. Рецепты
+        ранжируются по обратному индексу в памяти: сначала те, что
+        можно приготовить целиком, затем по числу недостающих
+        ингредиентов. Из базы данных загружается только текущая
+        страница.
+        """
+
+        serializer = PantrySerializer(data={
+            'ingredients': request.query_params.getlist('ingredients'),
+        })
+        serializer.is_valid(raise_exception=True)
+        ranking = pantry_index.match(
+            serializer.validated_data['ingredients'],
+        )
+        page = self.paginator.paginate_queryset(ranking, request)
+        recipes = self.get_queryset().in_bulk(
+            [recipe for recipe, _ in page],
+        )
+        shown = []
+        for recipe, missing in page:
+            if recipe in recipes:
+                recipes[recipe].missing_ingredients = missing
+                shown.append(recipes[recipe])
+        return self.get_paginated_response(
+            self.get_serializer(shown, many=True).data,
+        )
+
+    @decorators.action(
+        detail=True,
+        methods=['get'],
+        url_path='similar',
+        url_name='similar',
+    )
+    def get_similar(self, request, id=None):
+        """Похожие рецепты по ингредиентам и тэгам.
+
+        Список рассчитывается заранее командой build_similar_recipes
+        и обновляется при изменении рецептов, поэтому запрос читает
+        готовые пары по индексу. Параметр limit ограничивает выдачу.
+        """
+
+        recipe = get_object_or_404(Recipe.objects.only('pk'), pk=id)
+        limit = settings.SIMILAR_RECIPES_LIMIT
+        value = request.query_params.get('limit', '')
+        if value.isdigit():
+            limit = min(int(value), limit)
+        recipes = self.get_queryset().filter(
+            similar_to__recipe=recipe,
+        ).order_by('-similar_to__score', 'id')[:limit]
+        return response.Response(
+            self.get_serializer(recipes, many=True).data,
+        )
+
     @decorators.action(
         detail=True,
         methods=['post'],
@@ -149,6 +343,24 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         return delete_post(obj=Favorite, request=request, id=id)
 
+    @decorators.action(
+        detail=False,
+        methods=['post'],
+        url_path='favorite',
+        url_name='favorite-batch',
+        permission_classes=(permissions.IsAuthenticated, ),
+    )
+    def post_favorite_batch(self, request):
+        """Пакетное добавление рецептов в избранные."""
+
+        return create_batch(Favorite, request)
+
+    @post_favorite_batch.mapping.delete
+    def delete_favorite_batch(self, request):
+        """Пакетное удаление рецептов из избранных."""
+
+        return delete_batch(Favorite, request)
+
     @decorators.action(
         detail=True,
         methods=['post'],
@@ -169,42 +381,61 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         return delete_post(obj=ShoppingCart, request=request, id=id)
 
+    @decorators.action(
+        detail=False,
+        methods=['post'],
+        url_path='shopping_cart',
+        url_name='shopping_cart-batch',
+        permission_classes=(permissions.IsAuthenticated, ),
+    )
+    def post_shopping_cart_batch(self, request):
+        """Пакетное добавление рецептов в корзину покупок."""
+
+        return create_batch(ShoppingCart, request)
+
+    @post_shopping_cart_batch.mapping.delete
+    def delete_shopping_cart_batch(self, request):
+        """Пакетное удаление рецептов из корзины покупок."""
+
+        return delete_batch(ShoppingCart, request)
+
     @decorators.action(
         detail=False,
         methods=['get'],
         url_path='download_shopping_cart',
         url_name='download_shopping_cart',
-        permission_classes=(permissions.IsAuthenticated, )
+        permission_classes=(permissions.IsAuthenticated, ),
+        renderer_classes=(
+            TextShoppingCartRenderer,
+            CsvShoppingCartRenderer,
+            PdfShoppingCartRenderer,
+        ),
     )
     def get_download_shopping_cart(self, request):
-        """Файл со списком покупок."""
-
-        author = get_object_or_404(User, id=request.user.id)
-        ingredients_recipes = RecipeIngredient.objects.filter(
-            recipe__shopping_recipe__user=author,
-        ).values(
-            'ingredient__name', 'ingredient__measurement_unit',
-        ).annotate(
-            total_amount=Sum('amount'),
-        )
-        results_cart = 'Продуктовая корзина:\n'
-        if ingredients_recipes.exists():
-            for num, ingredient in enumerate(ingredients_recipes, 1):
-                results_cart += (
-                    f"{num}. "
-                    f"{ingredient['ingredient__name'].capitalize()} - "
-                    f"{ingredient['total_amount']} "
-                    f"{ingredient['ingredient__measurement_unit']}.\n"
-                )
-            response = HttpResponse(
-                content=results_cart, content_type='text/plain',
-                charset='utf-8',
-            )
-            response['Content-Disposition'] = (
-                'attachment; '
-                'filename="shopping_cart.txt"'
+        """Файл со списком покупок.
+
+        Формат выбирается параметром format (txt, csv, pdf)
+        или заголовком Accept.
+        """
+
+        ingredients = ShoppingList.objects.for_download(
+            request.user,
+        ).iterator()
+        first = next(ingredients, None)
+        if first is None:
+            return HttpResponseBadRequest(
+                'Продуктовая корзина пуста.'
             )
-            return response
-        return HttpResponseBadRequest(
-            'Продуктовая корзина пуста.'
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            renderer.stream(chain((first,), ingredients)),
+            content_type=content_type,
+        )
+        response['Content-Disposition'] = (
+            'attachment; '
+            f'filename="shopping_cart.{renderer.format}"'
         )
+        return response
@@ -36,6 +36,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -83,6 +84,13 @@ DATABASES = {
 USE_DB = os.getenv('USE_DB', default='postgresql').lower()
 DATABASES['default'] = DATABASES[USE_DB]
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator', },
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator', },
@@ -123,4 +131,32 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, '/media/')
 
+INGREDIENTS_SEARCH_LIMIT = 50
+
+CATALOG_CACHE_MAX_AGE = 60
+
+RECIPE_IDS_CACHE_TIMEOUT = 60 * 60
+
+RECIPE_IDS_FILTER_LIMIT = 500
+
+TAG_MAP_CACHE_TIMEOUT = 60 * 60
+
+RECIPE_CHANGES_TIMEOUT = 60 * 60 * 24
+
+# Счётчики избранного, корзин и подписок не сбрасывают кэш анонимных
+# ответов и отстают в нём не дольше этого времени.
+RESPONSE_CACHE_TIMEOUT = 60 * 10
+
+BATCH_MAX_SIZE = 100
+
+SIMILAR_RECIPES_LIMIT = 20
+
+PANTRY_MAX_INGREDIENTS = 100
+
+PERFORMANCE_MONITORING = os.getenv('PERFORMANCE_MONITORING', default='False').lower() == 'true'
+
+SLOW_REQUEST_THRESHOLD = int(os.getenv('SLOW_REQUEST_THRESHOLD', default=500))
+
+PDF_FONT_PATH = os.getenv('PDF_FONT_PATH', default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.db.models import Prefetch
 
 from .models import (
     Favorite, Ingredient, Recipe,
@@ -25,13 +26,19 @@ class IngredientAdmin(admin.ModelAdmin):
         'name',
         'measurement_unit',
     )
-    list_filter = ('name',)
-    search_fields = ('name',)
+    list_filter = ('measurement_unit',)
+    search_fields = ('^name',)
 
 
 class RecipeIngredientAdmin(admin.StackedInline):
     model = RecipeIngredient
     extra = 1
+    autocomplete_fields = ('ingredient',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'recipe__author', 'ingredient',
+        )
 
 
 @admin.register(Recipe)
@@ -44,30 +51,39 @@ class RecipeAdmin(admin.ModelAdmin):
         'get_ingredients',
         'get_tags',
         'cooking_time',
+        'favorites_count',
     )
-    list_filter = (
-        'author', 'name', 'tags',
-    )
+    list_filter = ('tags',)
     search_fields = (
-        'author', 'name', 'tags',
+        'name', '^author__username', '^author__email',
     )
+    date_hierarchy = 'pub_date'
+    autocomplete_fields = ('author',)
+    show_full_result_count = False
     inlines = (RecipeIngredientAdmin,)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'author',
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredient',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient',
+                ),
+            ),
+        )
+
     @admin.display(description='Ингредиенты')
     def get_ingredients(self, obj):
         return '\n'.join(
-            Recipe.objects.filter(id=obj.id).values_list(
-                'ingredients__name', flat=True,
-            )
+            item.ingredient.name for item in obj.recipe_ingredient.all()
         )
 
     @admin.display(description='Тэги')
     def get_tags(self, obj):
-        return '\n'.join(
-            Recipe.objects.filter(id=obj.id).values_list(
-                'tags__name', flat=True,
-            )
-        )
+        return '\n'.join(tag.name for tag in obj.tags.all())
 
 
 @admin.register(Favorite)
@@ -77,6 +93,8 @@ class FavoriteAdmin(admin.ModelAdmin):
         'recipe',
         'user',
     )
+    list_select_related = ('recipe__author', 'user')
+    autocomplete_fields = ('recipe', 'user')
 
 
 @admin.register(ShoppingCart)
@@ -86,3 +104,5 @@ class ShoppingCartAdmin(admin.ModelAdmin):
         'recipe',
         'user',
     )
+    list_select_related = ('recipe__author', 'user')
+    autocomplete_fields = ('recipe', 'user')
@@ -0,0 +1,160 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+INGREDIENTS_VERSION_KEY = 'catalog:ingredients:version'
+TAGS_VERSION_KEY = 'catalog:tags:version'
+CONTENT_VERSION_KEY = 'content:version'
+RECIPE_IDS_KEY = 'recipe_ids:{model}:{user}'
+RECIPE_IDS_STATS_KEY = 'recipe_ids:stats:{name}'
+TAG_MAP_KEY = 'catalog:tags:map:{version}'
+RECIPE_CHANGES_KEY = 'recipes:changes'
+RECIPE_CHANGE_KEY = 'recipes:changes:{position}'
+ALL_RECIPES = '*'
+
+
+def get_version(key):
+    """Текущая версия данных, хранящаяся в общем кэше.
+
+    Версия — это время последнего изменения данных. Если в кэше
+    её нет, она создаётся заново, что равносильно изменению данных.
+    """
+
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    """Обновляет версию данных после их изменения."""
+
+    version = time.time()
+    previous = cache.get(key)
+    if previous is not None and version <= previous:
+        version = previous + 0.001
+    cache.set(key, version, timeout=None)
+    return version
+
+
+def count_lookup(name):
+    key = RECIPE_IDS_STATS_KEY.format(name=name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_recipe_ids_stats():
+    """Количество попаданий и промахов кэша рецептов пользователей."""
+
+    return {
+        name: cache.get(RECIPE_IDS_STATS_KEY.format(name=name), 0)
+        for name in ('hits', 'misses')
+    }
+
+
+def get_recipe_ids_key(model, user_id):
+    return RECIPE_IDS_KEY.format(model=model._meta.model_name, user=user_id)
+
+
+def refresh_recipe_ids(model, user_id):
+    """Загружает из базы и кэширует рецепты пользователя из model."""
+
+    recipe_ids = frozenset(
+        model.objects.filter(user_id=user_id).values_list(
+            'recipe_id', flat=True,
+        )
+    )
+    cache.set(
+        get_recipe_ids_key(model, user_id), recipe_ids,
+        timeout=settings.RECIPE_IDS_CACHE_TIMEOUT,
+    )
+    return recipe_ids
+
+
+def get_recipe_ids(model, user_id):
+    """Множество id рецептов пользователя в избранном или корзине.
+
+    model — Favorite или ShoppingCart. Множество заполняется при первом
+    обращении и обновляется после изменения избранного и корзины.
+    """
+
+    recipe_ids = cache.get(get_recipe_ids_key(model, user_id))
+    if recipe_ids is not None:
+        count_lookup('hits')
+        return recipe_ids
+    count_lookup('misses')
+    return refresh_recipe_ids(model, user_id)
+
+
+def get_tag_map():
+    """Словарь {slug: id} всех тэгов.
+
+    Ключ содержит версию справочника тэгов, поэтому после изменения
+    тэгов словарь загружается заново.
+    """
+
+    from recipes.models import Tag
+
+    key = TAG_MAP_KEY.format(version=get_version(TAGS_VERSION_KEY))
+    tag_map = cache.get(key)
+    if tag_map is None:
+        tag_map = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, tag_map, timeout=settings.TAG_MAP_CACHE_TIMEOUT)
+    return tag_map
+
+
+def get_recipe_changes_position():
+    """Номер последней записи журнала изменений рецептов."""
+
+    position = cache.get(RECIPE_CHANGES_KEY)
+    if position is None:
+        cache.add(RECIPE_CHANGES_KEY, 0, timeout=None)
+        position = cache.get(RECIPE_CHANGES_KEY)
+    return position
+
+
+def log_recipe_changes(recipe_ids=ALL_RECIPES):
+    """Добавляет в журнал изменённые рецепты.
+
+    Журнал позволяет индексам в памяти процессов применять только
+    изменения; ALL_RECIPES означает, что индекс нужно перестроить.
+    """
+
+    try:
+        position = cache.incr(RECIPE_CHANGES_KEY)
+    except ValueError:
+        get_recipe_changes_position()
+        position = cache.incr(RECIPE_CHANGES_KEY)
+    cache.set(
+        RECIPE_CHANGE_KEY.format(position=position),
+        recipe_ids if recipe_ids == ALL_RECIPES else tuple(recipe_ids),
+        timeout=settings.RECIPE_CHANGES_TIMEOUT,
+    )
+    return position
+
+
+def get_recipe_changes(start, end):
+    """Рецепты из записей журнала с start до end включительно.
+
+    Возвращает ALL_RECIPES, если часть записей уже вытеснена
+    из кэша или требуется полное перестроение.
+    """
+
+    keys = [
+        RECIPE_CHANGE_KEY.format(position=position)
+        for position in range(start, end + 1)
+    ]
+    changes = cache.get_many(keys)
+    if len(changes) < len(keys):
+        return ALL_RECIPES
+    recipe_ids = set()
+    for change in changes.values():
+        if change == ALL_RECIPES:
+            return ALL_RECIPES
+        recipe_ids.update(change)
+    return recipe_ids
@@ -0,0 +1,46 @@
+from django.core import checks
+from django.db import connections
+
+from .search import SQLITE_FTS_TABLE, SQLITE_TRIGGERS
+
+
+@checks.register(checks.Tags.database)
+def check_search_triggers(app_configs=None, databases=None, **kwargs):
+    """Триггеры FTS5 на месте, если таблица поиска уже создана.
+
+    Без них поиск в SQLite молча перестаёт видеть новые и изменённые
+    рецепты. Проверка выполняется перед migrate, при запуске тестов
+    и командой check --database.
+    """
+
+    errors = []
+    for alias in databases or ():
+        connection = connections[alias]
+        if connection.vendor != 'sqlite':
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT type, name FROM sqlite_master '
+                'WHERE name = %s OR type = %s AND tbl_name = %s',
+                [SQLITE_FTS_TABLE, 'trigger', 'recipes_recipe'],
+            )
+            objects = set(cursor.fetchall())
+        if ('table', SQLITE_FTS_TABLE) not in objects:
+            continue
+        missing = [
+            name for name in SQLITE_TRIGGERS
+            if ('trigger', name) not in objects
+        ]
+        if missing:
+            errors.append(checks.Error(
+                f'В базе данных {alias} нет триггеров полнотекстового '
+                f'поиска: {", ".join(missing)}.',
+                hint=(
+                    'Таблицу recipes_recipe пересоздала миграция без '
+                    'восстановления триггеров; добавьте в неё их SQL, '
+                    'как в 0007_recipe_counters, и примените её с '
+                    'migrate --skip-checks.'
+                ),
+                id='recipes.E001',
+            ))
+    return errors
@@ -0,0 +1,101 @@
+from collections import Counter, namedtuple
+
+from django.contrib.auth import get_user_model
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Greatest
+
+from users.models import Subscription
+from .cache import CONTENT_VERSION_KEY, bump_version
+from .models import Favorite, Recipe, ShoppingCart
+
+User = get_user_model()
+
+CountField = namedtuple('CountField', ('model', 'target', 'field'))
+
+COUNTERS = {
+    'favorites': CountField(Favorite, 'recipe', 'favorites_count'),
+    'shopping_cart': CountField(
+        ShoppingCart, 'recipe', 'shopping_cart_count',
+    ),
+    'subscribers': CountField(Subscription, 'author', 'subscribers_count'),
+    'recipes': CountField(Recipe, 'author', 'recipes_count'),
+}
+MODEL_COUNTERS = {counter.model: counter for counter in COUNTERS.values()}
+
+
+def get_target_model(counter):
+    return counter.model._meta.get_field(counter.target).related_model
+
+
+def change_counter(model, targets, delta):
+    """Изменяет счётчик объектов, на которые ссылаются записи model.
+
+    targets может содержать повторы: объект получит delta за каждое
+    вхождение. Выполняется UPDATE с F() на каждое число повторов,
+    поэтому конкурентные изменения не теряются; вызывается
+    в транзакции изменения самих записей.
+
+    Версия контента не меняется: иначе каждое добавление в избранное
+    или корзину сбрасывало бы весь кэш анонимных ответов. Счётчики
+    в этих ответах отстают не дольше RESPONSE_CACHE_TIMEOUT.
+    """
+
+    counter = MODEL_COUNTERS[model]
+    if not delta:
+        return
+    groups = {}
+    for target, count in Counter(targets).items():
+        groups.setdefault(count, []).append(target)
+    if not groups:
+        return
+    for count, group in groups.items():
+        get_target_model(counter).objects.filter(pk__in=group).update(**{
+            counter.field: Greatest(
+                models.F(counter.field) + delta * count, 0,
+            ),
+        })
+
+
+def get_actual_count(counter):
+    return Coalesce(
+        models.Subquery(
+            counter.model.objects.filter(
+                **{counter.target: models.OuterRef('pk')}
+            ).order_by().values(counter.target).annotate(
+                total=models.Count('pk'),
+            ).values('total'),
+        ),
+        0,
+    )
+
+
+def recount(counter, batch_size, check=False):
+    """Сверяет счётчик с фактическим количеством записей пачками.
+
+    Возвращает количество объектов с расхождением; если check ложно,
+    расхождения исправляются.
+    """
+
+    queryset = get_target_model(counter).objects.order_by('pk')
+    drifted = 0
+    last_pk = 0
+    while True:
+        pks = list(queryset.filter(pk__gt=last_pk).values_list(
+            'pk', flat=True,
+        )[:batch_size])
+        if not pks:
+            if drifted and not check:
+                transaction.on_commit(
+                    lambda: bump_version(CONTENT_VERSION_KEY)
+                )
+            return drifted
+        last_pk = pks[-1]
+        batch = queryset.filter(pk__in=pks).annotate(
+            actual=get_actual_count(counter),
+        ).exclude(**{counter.field: models.F('actual')})
+        if check:
+            drifted += batch.count()
+        else:
+            drifted += queryset.filter(
+                pk__in=batch.values('pk'),
+            ).update(**{counter.field: get_actual_count(counter)})
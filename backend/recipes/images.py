@@ -0,0 +1,81 @@
+import hashlib
+import io
+import os
+import re
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+VARIANTS = {
+    'thumbnail': ('_thumbnail', (480, 480)),
+    'webp': ('', None),
+}
+WEBP_QUALITY = 80
+HASHED_NAME = re.compile(r'^[0-9a-f]{64}$')
+
+
+def get_variant_name(name, variant):
+    base, _ = os.path.splitext(name)
+    suffix, _ = VARIANTS[variant]
+    return f'{base}{suffix}.webp'
+
+
+def is_hashed(name):
+    base, _ = os.path.splitext(os.path.basename(name))
+    return bool(HASHED_NAME.match(base))
+
+
+def create_variants(name, data):
+    """Уменьшенные копии изображения в формате WebP."""
+
+    image = None
+    for variant, (_, size) in VARIANTS.items():
+        variant_name = get_variant_name(name, variant)
+        if default_storage.exists(variant_name):
+            continue
+        if image is None:
+            image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA')
+        copy = image.copy()
+        if size:
+            copy.thumbnail(size)
+        buffer = io.BytesIO()
+        copy.save(buffer, 'WEBP', quality=WEBP_QUALITY)
+        default_storage.save(variant_name, ContentFile(buffer.getvalue()))
+
+
+def store_image(file, upload_to):
+    """Сохраняет изображение под именем из хэша его содержимого.
+
+    Повторная загрузка той же фотографии не создаёт новых файлов,
+    а возвращает имя уже сохранённого изображения.
+    """
+
+    file.seek(0)
+    data = file.read()
+    digest = hashlib.sha256(data).hexdigest()
+    extension = os.path.splitext(file.name)[1].lower() or '.jpg'
+    name = f'{upload_to}{digest}{extension}'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+    create_variants(name, data)
+    return name
+
+
+def get_variant_urls(image):
+    """Адреса вариантов изображения.
+
+    Для изображений, загруженных до появления вариантов,
+    возвращается адрес оригинала.
+    """
+
+    if not image:
+        return {}
+    if not is_hashed(image.name):
+        return {variant: image.url for variant in VARIANTS}
+    return {
+        variant: default_storage.url(get_variant_name(image.name, variant))
+        for variant in VARIANTS
+    }
@@ -0,0 +1,56 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.similarity import (
+    build_similarities, process_similarity_updates,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Полный пересчёт похожих рецептов по сходству ингредиентов '
+        'и тэгов. С --pending пересчитываются только рецепты из очереди '
+        'изменений.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=settings.SIMILAR_RECIPES_LIMIT,
+            help='Количество похожих рецептов для каждого рецепта.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Количество строк в одной пачке.',
+        )
+        parser.add_argument(
+            '--pending',
+            action='store_true',
+            help=(
+                'Пересчитать только рецепты, изменённые после прошлого '
+                'запуска. Предназначено для периодического запуска.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if min(options['limit'], options['batch_size']) < 1:
+            raise CommandError(
+                'Количество похожих рецептов и размер пачки должны быть '
+                'положительными.'
+            )
+        started = time.monotonic()
+        if options['pending']:
+            count = process_similarity_updates(options['limit'])
+        else:
+            count = build_similarities(
+                options['limit'], options['batch_size'],
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Записано пар похожих рецептов {count} за '
+            f'{time.monotonic() - started:.1f} с.'
+        ))
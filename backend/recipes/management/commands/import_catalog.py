@@ -0,0 +1,114 @@
+import csv
+import time
+from collections import namedtuple
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.cache import (
+    INGREDIENTS_VERSION_KEY, TAGS_VERSION_KEY, bump_version,
+)
+from recipes.models import Ingredient, Tag
+
+Catalog = namedtuple(
+    'Catalog', ('model', 'fields', 'version_key', 'filename'),
+)
+
+CATALOGS = {
+    'ingredients': Catalog(
+        Ingredient, ('name', 'measurement_unit'),
+        INGREDIENTS_VERSION_KEY, 'ingredients.csv',
+    ),
+    'tags': Catalog(
+        Tag, ('name', 'color', 'slug'),
+        TAGS_VERSION_KEY, 'tags.csv',
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = 'Пакетная загрузка справочника из CSV-файла в базу данных.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'catalog',
+            choices=sorted(CATALOGS),
+            help='Название справочника.',
+        )
+        parser.add_argument(
+            'path',
+            nargs='?',
+            help='Путь к CSV-файлу, по умолчанию файл из каталога data.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одной пачке.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Выполнить загрузку и откатить транзакцию.',
+        )
+
+    def read_batches(self, file, catalog, batch_size):
+        """Строки файла пачками без повторов."""
+
+        seen = set()
+        reader = csv.reader(file)
+        while True:
+            rows = list(islice(reader, batch_size))
+            if not rows:
+                return
+            batch = []
+            for row in rows:
+                key = tuple(value.strip() for value in row)
+                if len(key) != len(catalog.fields):
+                    raise CommandError(
+                        f'Строка {reader.line_num}: ожидается '
+                        f'{len(catalog.fields)} поля, получено {len(key)}.'
+                    )
+                if key in seen:
+                    continue
+                seen.add(key)
+                batch.append(
+                    catalog.model(**dict(zip(catalog.fields, key)))
+                )
+            yield len(rows), batch
+
+    def handle(self, *args, **options):
+        catalog = CATALOGS[options['catalog']]
+        path = options['path'] or settings.BASE_DIR / 'data' / catalog.filename
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('Размер пачки должен быть положительным.')
+        started = time.monotonic()
+        total_rows = 0
+        with transaction.atomic():
+            count_before = catalog.model.objects.count()
+            try:
+                with open(path, encoding='utf-8', newline='') as file:
+                    for rows, batch in self.read_batches(
+                        file, catalog, batch_size,
+                    ):
+                        catalog.model.objects.bulk_create(
+                            batch, ignore_conflicts=True,
+                        )
+                        total_rows += rows
+            except OSError as error:
+                raise CommandError(f'Не удалось прочитать {path}: {error}')
+            created = catalog.model.objects.count() - count_before
+            if options['dry_run']:
+                transaction.set_rollback(True)
+        if not options['dry_run'] and created:
+            bump_version(catalog.version_key)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Проверка" if options["dry_run"] else "Загрузка"} '
+            f'справочника {options["catalog"]} выполнена: '
+            f'строк {total_rows}, новых записей {created}, '
+            f'{elapsed:.3f} с ({total_rows / max(elapsed, 1e-9):.0f} строк/с).'
+        ))
@@ -0,0 +1,99 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipes.models import RecipeIngredient, ShoppingCart, ShoppingList
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересборка сводных списков покупок и их сверка '
+        'с агрегатом по корзинам.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить списки, не изменяя их.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки при записи строк.',
+        )
+
+    def lock_tables(self, check):
+        """Блокирует корзины, ингредиенты рецептов и списки покупок.
+
+        Пока идёт сверка или пересборка, изменения корзин и рецептов
+        ждут конца транзакции и не теряются между чтением агрегата
+        и записью строк. SQLite и так допускает одну пишущую транзакцию.
+        """
+
+        if connection.vendor != 'postgresql':
+            return
+        tables = [
+            connection.ops.quote_name(model._meta.db_table)
+            for model in (ShoppingCart, RecipeIngredient)
+        ]
+        list_table = connection.ops.quote_name(ShoppingList._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'LOCK TABLE {", ".join(tables)} IN SHARE MODE'
+            )
+            cursor.execute(
+                f'LOCK TABLE {list_table} IN '
+                f'{"SHARE" if check else "EXCLUSIVE"} MODE'
+            )
+
+    def get_live_totals(self):
+        return {
+            (row['user'], row['ingredient']): row['total']
+            for row in ShoppingList.objects.live_totals().iterator()
+        }
+
+    def get_stored_totals(self):
+        return {
+            (user, ingredient): total
+            for user, ingredient, total in ShoppingList.objects.values_list(
+                'user', 'ingredient', 'total_amount',
+            ).iterator()
+        }
+
+    def rebuild(self, live_totals, batch_size):
+        ShoppingList.objects.all().delete()
+        ShoppingList.objects.bulk_create(
+            (
+                ShoppingList(
+                    user_id=user,
+                    ingredient_id=ingredient,
+                    total_amount=total,
+                )
+                for (user, ingredient), total in live_totals.items()
+            ),
+            batch_size=batch_size,
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.lock_tables(options['check'])
+            live_totals = self.get_live_totals()
+            if not options['check']:
+                self.rebuild(live_totals, options['batch_size'])
+            stored_totals = self.get_stored_totals()
+        if not options['check']:
+            self.stdout.write(
+                f'Записано строк списков покупок: {len(live_totals)}.'
+            )
+        mismatches = [
+            key for key in live_totals.keys() | stored_totals.keys()
+            if live_totals.get(key) != stored_totals.get(key)
+        ]
+        if mismatches:
+            raise CommandError(
+                f'Расхождений в списках покупок: {len(mismatches)}.'
+            )
+        self.stdout.write(
+            self.style.SUCCESS('Списки покупок совпадают с корзинами.')
+        )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from recipes.cache import get_recipe_ids_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Статистика кэша избранного и корзины: '
+        'количество попаданий и промахов.'
+    )
+
+    def handle(self, *args, **options):
+        stats = get_recipe_ids_stats()
+        lookups = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / lookups if lookups else 0
+        self.stdout.write(
+            f'Попаданий: {stats["hits"]}, промахов: {stats["misses"]}, '
+            f'доля попаданий: {ratio:.1%}.'
+        )
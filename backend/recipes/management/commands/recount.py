@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.counters import COUNTERS, recount
+
+
+class Command(BaseCommand):
+    help = 'Сверка и исправление счётчиков популярности пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'counters',
+            nargs='*',
+            help=(
+                f'Счётчики для сверки: {", ".join(COUNTERS)}, '
+                'по умолчанию все.'
+            ),
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить счётчики, не изменяя их.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество объектов в одной пачке.',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('Размер пачки должен быть положительным.')
+        unknown = set(options['counters']) - COUNTERS.keys()
+        if unknown:
+            raise CommandError(
+                f'Неизвестные счётчики: {", ".join(sorted(unknown))}.'
+            )
+        total = 0
+        for name in options['counters'] or COUNTERS:
+            drifted = recount(
+                COUNTERS[name], options['batch_size'], options['check'],
+            )
+            total += drifted
+            self.stdout.write(f'{name}: расхождений {drifted}.')
+        if options['check'] and total:
+            raise CommandError(f'Расхождений в счётчиках: {total}.')
+        self.stdout.write(self.style.SUCCESS('Счётчики сверены.'))
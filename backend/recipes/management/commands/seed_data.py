@@ -0,0 +1,317 @@
+import io
+import random
+import time
+from collections import Counter
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from PIL import Image
+
+from recipes.cache import (
+    CONTENT_VERSION_KEY, bump_version, log_recipe_changes,
+)
+from recipes.counters import COUNTERS, recount
+from recipes.images import store_image
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    ShoppingList, Tag,
+)
+from users.models import Subscription
+
+User = get_user_model()
+
+SEED_PASSWORD = 'seed-password'
+PALETTE_SIZE = 8
+INGREDIENTS_PER_RECIPE = (3, 15, 7)
+TAGS_PER_RECIPE = (1, 3)
+CART_USERS_SHARE = 0.3
+CART_RECIPES = (1, 5)
+
+
+def get_cum_weights(size, exponent):
+    """Накопленные веса степенного распределения для random.choices."""
+
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)
+    ))
+
+
+def insert_rows(model, fields, rows, batch_size):
+    """Вставка кортежей значений многострочным INSERT.
+
+    Объекты моделей не создаются: для миллионов строк связей их
+    построение в bulk_create занимает больше времени, чем сама запись.
+    Поля должны быть простыми значениями без преобразования.
+    """
+
+    quote = connection.ops.quote_name
+    columns = [model._meta.get_field(field).column for field in fields]
+    batch_size = min(
+        batch_size, connection.ops.bulk_batch_size(columns, rows) or 1,
+    )
+    prefix = 'INSERT INTO {} ({}) VALUES '.format(
+        quote(model._meta.db_table),
+        ', '.join(quote(column) for column in columns),
+    )
+    placeholder = '({})'.format(', '.join(['%s'] * len(columns)))
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cursor.execute(
+                prefix + ', '.join([placeholder] * len(batch)),
+                [value for row in batch for value in row],
+            )
+    return len(rows)
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерация синтетических пользователей, рецептов, избранного, '
+        'корзин и подписок для нагрузочной проверки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=1000,
+            help='Количество пользователей.',
+        )
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=10000,
+            help='Количество рецептов.',
+        )
+        parser.add_argument(
+            '--favorites',
+            type=int,
+            default=20,
+            help='Среднее количество избранных рецептов у пользователя.',
+        )
+        parser.add_argument(
+            '--subscriptions',
+            type=int,
+            default=10,
+            help='Среднее количество подписок у пользователя.',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Начальное значение генератора случайных чисел.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Количество строк в одной пачке.',
+        )
+        parser.add_argument(
+            '--skip-images',
+            action='store_true',
+            help='Не создавать файлы изображений для рецептов.',
+        )
+
+    def sample(self, population, cum_weights, count):
+        """Уникальные элементы с вероятностью по степенному закону."""
+
+        count = min(count, len(population))
+        result = dict.fromkeys(self.rng.choices(
+            population, cum_weights=cum_weights, k=count * 2,
+        ))
+        while len(result) < count:
+            result.update(dict.fromkeys(self.rng.choices(
+                population, cum_weights=cum_weights, k=count - len(result),
+            )))
+        return list(result)[:count]
+
+    def get_count(self, mean):
+        """Количество с тяжёлым хвостом и заданным средним."""
+
+        return int(mean * (self.rng.paretovariate(2) - 1))
+
+    def create_images(self):
+        upload_to = Recipe._meta.get_field('image').upload_to
+        names = []
+        for _ in range(PALETTE_SIZE):
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            buffer = io.BytesIO()
+            Image.new('RGB', (640, 480), color).save(buffer, 'JPEG')
+            names.append(store_image(
+                ContentFile(buffer.getvalue(), name='seed.jpg'), upload_to,
+            ))
+        return names
+
+    def create_users(self, count, seed, batch_size):
+        prefix = f'seed{seed}_'
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(
+                f'Данные с начальным значением {seed} уже созданы.'
+            )
+        password = make_password(SEED_PASSWORD)
+        users = User.objects.bulk_create(
+            (
+                User(
+                    email=f'{prefix}{number}@example.com',
+                    username=f'{prefix}{number}',
+                    first_name=f'Имя {prefix}{number}',
+                    last_name=f'Фамилия {prefix}{number}',
+                    password=password,
+                )
+                for number in range(count)
+            ),
+            batch_size=batch_size,
+        )
+        return [user.pk for user in users]
+
+    def create_recipes(self, count, seed, authors, images, batch_size):
+        ingredients = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+        tags = list(Tag.objects.order_by('id').values_list('id', flat=True))
+        if not ingredients or not tags:
+            raise CommandError(
+                'Справочники пусты, выполните load_ingredients и load_tags.'
+            )
+        ingredient_weights = get_cum_weights(len(ingredients), 0.8)
+        author_weights = get_cum_weights(len(authors), 1.1)
+        tags_through = Recipe.tags.through
+        recipe_ingredients = []
+        recipe_tags = []
+        recipe_ids = []
+        recipe_amounts = {}
+        recipe_counts = Counter()
+        for start in range(0, count, batch_size):
+            numbers = range(start, min(start + batch_size, count))
+            recipes = Recipe.objects.bulk_create([
+                Recipe(
+                    author_id=self.rng.choices(
+                        authors, cum_weights=author_weights,
+                    )[0],
+                    name=f'Рецепт {seed}-{number}',
+                    text=f'Описание рецепта {seed}-{number}.',
+                    image=self.rng.choice(images) if images else '',
+                    cooking_time=self.rng.randint(5, 180),
+                )
+                for number in numbers
+            ])
+            for recipe in recipes:
+                amounts = {
+                    ingredient: self.rng.randint(1, 500)
+                    for ingredient in self.sample(
+                        ingredients, ingredient_weights,
+                        round(self.rng.triangular(*INGREDIENTS_PER_RECIPE)),
+                    )
+                }
+                recipe_amounts[recipe.pk] = amounts
+                recipe_ingredients.extend(
+                    (recipe.pk, ingredient, amount)
+                    for ingredient, amount in amounts.items()
+                )
+                recipe_tags.extend(
+                    (recipe.pk, tag)
+                    for tag in self.rng.sample(
+                        tags, min(
+                            self.rng.randint(*TAGS_PER_RECIPE), len(tags),
+                        ),
+                    )
+                )
+                recipe_ids.append(recipe.pk)
+                recipe_counts[recipe.author_id] += 1
+        insert_rows(
+            RecipeIngredient, ('recipe', 'ingredient', 'amount'),
+            recipe_ingredients, batch_size,
+        )
+        insert_rows(tags_through, ('recipe', 'tag'), recipe_tags, batch_size)
+        authors = [author for author, _ in recipe_counts.most_common()]
+        return recipe_ids, recipe_amounts, authors
+
+    def create_relations(self, users, recipes, options):
+        recipe_ids, recipe_amounts, authors = recipes
+        batch_size = options['batch_size']
+        recipe_weights = get_cum_weights(len(recipe_ids), 1.0)
+        recipe_order = recipe_ids[:]
+        self.rng.shuffle(recipe_order)
+        author_weights = get_cum_weights(len(authors), 1.1)
+        favorites = []
+        carts = []
+        subscriptions = []
+        shopping_lists = Counter()
+        for user in users:
+            favorites.extend(
+                (user, recipe)
+                for recipe in self.sample(
+                    recipe_order, recipe_weights,
+                    self.get_count(options['favorites']),
+                )
+            )
+            if self.rng.random() < CART_USERS_SHARE:
+                for recipe in self.sample(
+                    recipe_order, recipe_weights,
+                    self.rng.randint(*CART_RECIPES),
+                ):
+                    carts.append((user, recipe))
+                    for ingredient, amount in recipe_amounts[recipe].items():
+                        shopping_lists[(user, ingredient)] += amount
+            subscriptions.extend(
+                (user, author)
+                for author in self.sample(
+                    authors, author_weights,
+                    self.get_count(options['subscriptions']),
+                )
+                if author != user
+            )
+        insert_rows(Favorite, ('user', 'recipe'), favorites, batch_size)
+        insert_rows(ShoppingCart, ('user', 'recipe'), carts, batch_size)
+        insert_rows(
+            ShoppingList, ('user', 'ingredient', 'total_amount'),
+            [
+                (user, ingredient, total)
+                for (user, ingredient), total in shopping_lists.items()
+            ],
+            batch_size,
+        )
+        insert_rows(
+            Subscription, ('subscriber', 'author'), subscriptions,
+            batch_size,
+        )
+        return len(favorites), len(carts), len(subscriptions)
+
+    def handle(self, *args, **options):
+        if min(options['users'], options['recipes']) < 1:
+            raise CommandError(
+                'Количество пользователей и рецептов должно быть '
+                'положительным.'
+            )
+        if options['batch_size'] < 1:
+            raise CommandError('Размер пачки должен быть положительным.')
+        self.rng = random.Random(options['seed'])
+        started = time.monotonic()
+        images = [] if options['skip_images'] else self.create_images()
+        with transaction.atomic():
+            users = self.create_users(
+                options['users'], options['seed'], options['batch_size'],
+            )
+            recipes = self.create_recipes(
+                options['recipes'], options['seed'], users, images,
+                options['batch_size'],
+            )
+            favorites, carts, subscriptions = self.create_relations(
+                users, recipes, options,
+            )
+            for counter in COUNTERS.values():
+                recount(counter, options['batch_size'])
+            transaction.on_commit(lambda: bump_version(CONTENT_VERSION_KEY))
+            transaction.on_commit(log_recipe_changes)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей {len(users)}, рецептов '
+            f'{len(recipes[0])}, избранных {favorites}, в корзинах {carts}, '
+            f'подписок {subscriptions} за {elapsed:.1f} с '
+            f'({len(recipes[0]) / max(elapsed, 1e-9) * 60:.0f} рецептов/мин).'
+        ))
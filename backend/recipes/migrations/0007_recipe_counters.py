@@ -0,0 +1,98 @@
+# Generated by Django 4.2.5 on 2026-10-18 19:14
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('recipes', 'Recipe', 'favorites_count', 'recipes', 'Favorite', 'recipe'),
+    (
+        'recipes', 'Recipe', 'shopping_cart_count',
+        'recipes', 'ShoppingCart', 'recipe',
+    ),
+    (
+        'users', 'CustomUser', 'subscribers_count',
+        'users', 'Subscription', 'author',
+    ),
+    ('users', 'CustomUser', 'recipes_count', 'recipes', 'Recipe', 'author'),
+)
+
+# SQLite пересоздаёт recipes_recipe при добавлении столбцов, и триггеры
+# FTS5 удаляются вместе со старой таблицей. SQL скопирован из
+# 0006_recipe_search_index, чтобы не зависеть от кода приложения.
+SQLITE_TRIGGERS = (
+    '''
+    CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_insert
+    AFTER INSERT ON recipes_recipe BEGIN
+        INSERT INTO recipes_recipe_fts (rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_delete
+    AFTER DELETE ON recipes_recipe BEGIN
+        INSERT INTO recipes_recipe_fts (
+            recipes_recipe_fts, rowid, name, text
+        ) VALUES ('delete', old.id, old.name, old.text);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_update
+    AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+        INSERT INTO recipes_recipe_fts (
+            recipes_recipe_fts, rowid, name, text
+        ) VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO recipes_recipe_fts (rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    ''',
+)
+
+
+def restore_sqlite_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in SQLITE_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+def fill_counters(apps, schema_editor):
+    for app, model, field, source_app, source, target in COUNTERS:
+        source_model = apps.get_model(source_app, source)
+        apps.get_model(app, model).objects.update(**{
+            field: Coalesce(
+                models.Subquery(
+                    source_model.objects.filter(
+                        **{target: models.OuterRef('pk')}
+                    ).order_by().values(target).annotate(
+                        total=models.Count('pk'),
+                    ).values('total'),
+                ),
+                0,
+            ),
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_search_index'),
+        ('users', '0003_customuser_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В корзинах'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_favorites_count_idx'),
+        ),
+        migrations.RunPython(restore_sqlite_triggers, migrations.RunPython.noop),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.5 on 2026-10-18 19:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipesimilarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityUpdate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe', models.PositiveBigIntegerField(verbose_name='Рецепт')),
+                ('features_changed', models.BooleanField(default=True, verbose_name='Изменились ингредиенты или тэги')),
+            ],
+            options={
+                'verbose_name': 'Пересчёт похожих рецептов',
+                'verbose_name_plural': 'Пересчёт похожих рецептов',
+                'ordering': ('pk',),
+            },
+        ),
+    ]
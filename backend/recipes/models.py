@@ -3,6 +3,11 @@ from colorfield.fields import ColorField
 from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models.functions import Greatest
+
+from users.models import Subscription
+from .images import store_image
+from .search import search_recipes
 
 User = get_user_model()
 
@@ -62,11 +67,50 @@ class Ingredient(models.Model):
         ordering = ('name',)
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_name_measurement_unit',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name} - {self.measurement_unit}.'
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Queryset рецептов."""
+
+    def with_related(self, user=None):
+        """Подгружает автора, тэги и ингредиенты рецептов."""
+
+        return self.prefetch_related(
+            models.Prefetch(
+                'author',
+                queryset=User.objects.with_is_subscribed(user),
+            ),
+            'tags',
+            models.Prefetch(
+                'recipe_ingredient',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient',
+                ),
+            ),
+        )
+
+    def feed(self, user):
+        """Рецепты авторов, на которых подписан пользователь."""
+
+        return self.filter(author__in=Subscription.objects.filter(
+            subscriber=user,
+        ).values('author'))
+
+    def search(self, query):
+        """Полнотекстовый поиск по названию и описанию."""
+
+        return search_recipes(self, query)
+
+
 class Recipe(models.Model):
     """Модель рецепта."""
 
@@ -121,11 +165,37 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации',
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном',
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В корзинах',
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=('-favorites_count', '-id'),
+                name='recipe_favorites_count_idx',
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_idx',
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=('author', 'name'),
@@ -136,6 +206,13 @@ class Recipe(models.Model):
     def __str__(self):
         return f'{self.name} - автор {self.author}.'
 
+    def save(self, *args, **kwargs):
+        if self.image and not self.image._committed:
+            self.image = store_image(
+                self.image, self._meta.get_field('image').upload_to,
+            )
+        super().save(*args, **kwargs)
+
 
 class RecipeIngredient(models.Model):
     """Вспомогательная модель для рецептов и ингредиентов."""
@@ -239,3 +316,233 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.recipe} в списке покупок у {self.user}.'
+
+
+class ShoppingListQuerySet(models.QuerySet):
+    """Queryset сводного списка покупок."""
+
+    def get_recipes_amounts(self, recipes):
+        return RecipeIngredient.objects.filter(
+            recipe__in=recipes,
+        ).values(
+            'ingredient',
+        ).annotate(
+            total=models.Sum('amount'),
+        ).order_by()
+
+    def add_recipes(self, users, recipes):
+        """Добавляет ингредиенты рецептов в списки покупок пользователей."""
+
+        amounts = self.get_recipes_amounts(recipes)
+        ingredients = [item['ingredient'] for item in amounts]
+        if not ingredients:
+            return
+        self.bulk_create(
+            [
+                ShoppingList(user_id=user, ingredient_id=ingredient)
+                for user in users
+                for ingredient in ingredients
+            ],
+            ignore_conflicts=True,
+        )
+        self.filter(
+            user__in=users, ingredient__in=ingredients,
+        ).update(
+            total_amount=models.F('total_amount') + models.Subquery(
+                amounts.filter(
+                    ingredient=models.OuterRef('ingredient'),
+                ).values('total'),
+            ),
+        )
+
+    def remove_recipes(self, users, recipes):
+        """Вычитает ингредиенты рецептов из списков покупок пользователей."""
+
+        amounts = self.get_recipes_amounts(recipes)
+        self.filter(
+            user__in=users,
+            ingredient__in=amounts.values('ingredient'),
+        ).update(
+            total_amount=Greatest(
+                models.F('total_amount') - models.Subquery(
+                    amounts.filter(
+                        ingredient=models.OuterRef('ingredient'),
+                    ).values('total'),
+                ),
+                0,
+            ),
+        )
+        self.filter(user__in=users, total_amount=0).delete()
+
+    def change_amounts(self, users, deltas):
+        """Изменяет количества ингредиентов на разницу после правки рецепта.
+
+        deltas — словарь {ингредиент: изменение количества}.
+        """
+
+        deltas = {
+            ingredient: delta for ingredient, delta in deltas.items() if delta
+        }
+        if not deltas:
+            return
+        self.bulk_create(
+            [
+                ShoppingList(user_id=user, ingredient_id=ingredient)
+                for user in users
+                for ingredient, delta in deltas.items()
+                if delta > 0
+            ],
+            ignore_conflicts=True,
+        )
+        self.filter(
+            user__in=users, ingredient__in=deltas,
+        ).update(
+            total_amount=Greatest(
+                models.F('total_amount') + models.Case(
+                    *(
+                        models.When(ingredient=ingredient, then=delta)
+                        for ingredient, delta in deltas.items()
+                    ),
+                    default=0,
+                ),
+                0,
+            ),
+        )
+        self.filter(user__in=users, total_amount=0).delete()
+
+    def change_recipe_amounts(self, recipe, deltas):
+        """Применяет изменения количеств рецепта ко всем его корзинам."""
+
+        users = list(ShoppingCart.objects.filter(
+            recipe=recipe,
+        ).values_list('user', flat=True))
+        if users:
+            self.change_amounts(users, deltas)
+
+    def for_download(self, user):
+        """Строки списка покупок пользователя для выгрузки в файл."""
+
+        return self.filter(
+            user=user,
+        ).values(
+            'ingredient__name', 'ingredient__measurement_unit',
+            'total_amount',
+        ).order_by(
+            'ingredient__name',
+        )
+
+    def live_totals(self):
+        """Агрегат списков покупок, посчитанный по корзинам."""
+
+        return RecipeIngredient.objects.filter(
+            recipe__shopping_recipe__isnull=False,
+        ).values(
+            'ingredient', user=models.F('recipe__shopping_recipe__user'),
+        ).annotate(
+            total=models.Sum('amount'),
+        ).order_by()
+
+
+class ShoppingList(models.Model):
+    """Сводный список покупок пользователя.
+
+    Хранит суммарное количество каждого ингредиента по всем рецептам
+    из корзины. Обновляется сигналами при сохранении и удалении записей
+    корзины, рецептов и их ингредиентов; массовые операции (bulk_create,
+    bulk_update, update) должны обновлять его сами.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+    )
+    total_amount = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Общее количество',
+    )
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'Сводный список покупок'
+        verbose_name_plural = 'Сводные списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_user_ingredient',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} {self.total_amount}.'
+
+
+class RecipeSimilarity(models.Model):
+    """Модель похожих рецептов.
+
+    Для каждого рецепта хранятся SIMILAR_RECIPES_LIMIT ближайших
+    по ингредиентам и тэгам рецептов, рассчитанных заранее.
+    """
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similarities',
+        verbose_name='Рецепт',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт',
+    )
+    score = models.FloatField(
+        verbose_name='Сходство',
+    )
+
+    class Meta:
+        ordering = ('recipe', '-score')
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='unique_recipe_similar',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.similar} похож на {self.recipe}.'
+
+
+class SimilarityUpdate(models.Model):
+    """Модель очереди пересчёта похожих рецептов.
+
+    Запись добавляется в транзакции изменения рецепта, а сам пересчёт
+    выполняет команда build_similar_recipes --pending. Рецепт хранится
+    числом, а не ссылкой, чтобы запись пережила удаление рецепта.
+    """
+
+    recipe = models.PositiveBigIntegerField(
+        verbose_name='Рецепт',
+    )
+    features_changed = models.BooleanField(
+        default=True,
+        verbose_name='Изменились ингредиенты или тэги',
+    )
+
+    class Meta:
+        ordering = ('pk',)
+        verbose_name = 'Пересчёт похожих рецептов'
+        verbose_name_plural = 'Пересчёт похожих рецептов'
+
+    def __str__(self):
+        return f'Пересчёт похожих рецептов для {self.recipe}.'
@@ -0,0 +1,73 @@
+import re
+
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVectorField,
+)
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+
+# Объекты полнотекстового поиска создаются миграцией
+# 0006_recipe_search_index и не описаны в модели. Миграция, пересоздающая
+# recipes_recipe в SQLite, должна заново создать триггеры FTS5
+# (см. 0007_recipe_counters); проверка recipes.E001 напомнит об этом.
+SQLITE_FTS_TABLE = 'recipes_recipe_fts'
+SQLITE_TRIGGERS = (
+    'recipes_recipe_fts_insert',
+    'recipes_recipe_fts_delete',
+    'recipes_recipe_fts_update',
+)
+
+SQLITE_MATCH = (
+    'SELECT rowid FROM recipes_recipe_fts WHERE recipes_recipe_fts MATCH %s'
+)
+SQLITE_RANK = (
+    'SELECT -bm25(recipes_recipe_fts, 2.0, 1.0) FROM recipes_recipe_fts '
+    'WHERE recipes_recipe_fts MATCH %s '
+    'AND recipes_recipe_fts.rowid = recipes_recipe.id'
+)
+
+
+def get_sqlite_query(query):
+    return ' '.join(
+        '"{}"*'.format(word) for word in re.findall(r'\w+', query)
+    )
+
+
+def search_recipes(queryset, query):
+    """Рецепты, подходящие под запрос, упорядоченные по релевантности.
+
+    В PostgreSQL используется хранимый столбец tsvector с GIN-индексом,
+    в SQLite — виртуальная таблица FTS5, синхронизируемая триггерами.
+    Оба объекта создаются миграцией и не описаны в модели.
+    """
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        vector = RawSQL(
+            '"recipes_recipe"."search_vector"', [],
+            output_field=SearchVectorField(),
+        )
+        search_query = SearchQuery(
+            query, config=SEARCH_CONFIG, search_type='websearch',
+        )
+        return queryset.annotate(
+            document=vector,
+            search_rank=SearchRank(vector, search_query),
+        ).filter(
+            document=search_query,
+        ).order_by('-search_rank', '-pub_date', '-id')
+    if vendor == 'sqlite':
+        sqlite_query = get_sqlite_query(query)
+        if not sqlite_query:
+            return queryset.none()
+        return queryset.filter(
+            id__in=RawSQL(SQLITE_MATCH, (sqlite_query,)),
+        ).annotate(
+            search_rank=RawSQL(SQLITE_RANK, (sqlite_query,)),
+        ).order_by('-search_rank', '-pub_date', '-id')
+    return queryset.filter(
+        Q(name__icontains=query) | Q(text__icontains=query)
+    )
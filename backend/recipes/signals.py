@@ -0,0 +1,233 @@
+from django.contrib.auth import get_user_model
+from django.db import models, transaction
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+
+from users.models import Subscription
+from .cache import (
+    CONTENT_VERSION_KEY, INGREDIENTS_VERSION_KEY, TAGS_VERSION_KEY,
+    bump_version, log_recipe_changes,
+)
+from .counters import MODEL_COUNTERS, change_counter, get_target_model
+from .models import (
+    Favorite, Ingredient, Recipe,
+    RecipeIngredient, ShoppingCart, ShoppingList, Tag,
+)
+
+User = get_user_model()
+
+
+def bump_content_version():
+    transaction.on_commit(lambda: bump_version(CONTENT_VERSION_KEY))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(**kwargs):
+    transaction.on_commit(lambda: bump_version(INGREDIENTS_VERSION_KEY))
+    bump_content_version()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(**kwargs):
+    transaction.on_commit(lambda: bump_version(TAGS_VERSION_KEY))
+    bump_content_version()
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipes_changed(**kwargs):
+    bump_content_version()
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_saved(instance, **kwargs):
+    recipe_ids = [instance.pk]
+    transaction.on_commit(lambda: log_recipe_changes(recipe_ids))
+
+
+@receiver((post_save, post_delete), sender=User)
+def author_changed(update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    bump_content_version()
+
+
+def is_deleted(model, pk, origin):
+    """Удаляется ли объект model с первичным ключом pk сам по себе.
+
+    origin — объект или QuerySet, с которого началось удаление.
+    Объекты, удаляемые каскадом, сюда не входят.
+    """
+
+    if isinstance(origin, models.QuerySet):
+        if origin.model is not model:
+            return False
+        if '_deleted_pks' not in origin.__dict__:
+            origin._deleted_pks = set(origin.values_list('pk', flat=True))
+        return pk in origin._deleted_pks
+    return isinstance(origin, model) and origin.pk == pk
+
+
+def get_deleted_rows(instance, origin, fields, handler):
+    """Значения fields удаляемых записей модели instance.
+
+    При удалении QuerySet сигнал приходит для каждой записи, поэтому
+    все записи обрабатываются одной пачкой при первом сигнале
+    обработчика handler, а для остальных возвращается пустой список.
+    """
+
+    model = type(instance)
+    if isinstance(origin, models.QuerySet) and origin.model is model:
+        handled = origin.__dict__.setdefault('_handled_signals', set())
+        if handler in handled:
+            return []
+        handled.add(handler)
+        return list(origin.values_list(*fields))
+    return [tuple(
+        getattr(instance, model._meta.get_field(field).attname)
+        for field in fields
+    )]
+
+
+def group_by_first(rows):
+    groups = {}
+    for key, value in rows:
+        groups.setdefault(key, []).append(value)
+    return groups
+
+
+def change_recipe_amounts(changes):
+    """Применяет изменения (рецепт, ингредиент, разница) к спискам."""
+
+    deltas = {}
+    for recipe, ingredient, delta in changes:
+        recipe_deltas = deltas.setdefault(recipe, {})
+        recipe_deltas[ingredient] = recipe_deltas.get(ingredient, 0) + delta
+    for recipe, recipe_deltas in deltas.items():
+        ShoppingList.objects.change_recipe_amounts(recipe, recipe_deltas)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_saved(instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ShoppingList.objects.add_recipes(
+            [instance.user_id], [instance.recipe_id],
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def shopping_cart_deleted(instance, origin=None, **kwargs):
+    """Вычитает рецепт из списка покупок до удаления записи корзины.
+
+    Пока идут сигналы pre_delete, ингредиенты рецепта ещё на месте.
+    Корзины удаляемого рецепта учитывает recipe_deleted, а список
+    удаляемого пользователя удаляется каскадом.
+    """
+
+    rows = [
+        (user, recipe) for user, recipe in get_deleted_rows(
+            instance, origin, ('user', 'recipe'), shopping_cart_deleted,
+        )
+        if not is_deleted(Recipe, recipe, origin)
+        and not is_deleted(User, user, origin)
+    ]
+    for user, recipes in group_by_first(rows).items():
+        ShoppingList.objects.remove_recipes([user], recipes)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(instance, origin=None, **kwargs):
+    if not is_deleted(Recipe, instance.pk, origin):
+        return
+    users = list(instance.shopping_recipe.values_list('user', flat=True))
+    if users:
+        ShoppingList.objects.remove_recipes(users, [instance.pk])
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def recipe_ingredient_saving(instance, raw=False, **kwargs):
+    instance._saved_values = None
+    if instance.pk and not raw:
+        instance._saved_values = RecipeIngredient.objects.filter(
+            pk=instance.pk,
+        ).values_list('recipe', 'ingredient', 'amount').first()
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(instance, raw=False, **kwargs):
+    """Переносит правку ингредиента рецепта в списки покупок.
+
+    Сохранение по одной записи идёт, например, из админки; сериализатор
+    рецепта применяет bulk_create и bulk_update и обновляет списки сам.
+    """
+
+    if raw:
+        return
+    changes = [
+        (instance.recipe_id, instance.ingredient_id, instance.amount),
+    ]
+    if getattr(instance, '_saved_values', None):
+        recipe, ingredient, amount = instance._saved_values
+        changes.append((recipe, ingredient, -amount))
+    change_recipe_amounts(changes)
+
+
+@receiver(pre_delete, sender=RecipeIngredient)
+def recipe_ingredient_deleted(instance, origin=None, **kwargs):
+    """Вычитает удаляемые ингредиенты рецептов из списков покупок.
+
+    При каскадном удалении вместе с рецептом, пользователем или
+    ингредиентом списки обновляют другие обработчики или каскад.
+    """
+
+    if not (
+        isinstance(origin, RecipeIngredient)
+        or isinstance(origin, models.QuerySet)
+        and origin.model is RecipeIngredient
+    ):
+        return
+    rows = get_deleted_rows(
+        instance, origin, ('recipe', 'ingredient', 'amount'),
+        recipe_ingredient_deleted,
+    )
+    change_recipe_amounts(
+        (recipe, ingredient, -amount) for recipe, ingredient, amount in rows
+    )
+
+
+def get_counted_target(instance):
+    return getattr(
+        instance, f'{MODEL_COUNTERS[type(instance)].target}_id',
+    )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_save, sender=Recipe)
+def counted_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_counter(sender, [get_counted_target(instance)], 1)
+
+
+@receiver(pre_delete, sender=Favorite)
+@receiver(pre_delete, sender=ShoppingCart)
+@receiver(pre_delete, sender=Subscription)
+@receiver(pre_delete, sender=Recipe)
+def counted_deleted(sender, instance, origin=None, **kwargs):
+    """Уменьшает счётчики объектов, на которые ссылались записи.
+
+    Счётчик удаляемого вместе с записью объекта не меняется.
+    """
+
+    counter = MODEL_COUNTERS[sender]
+    target_model = get_target_model(counter)
+    change_counter(sender, [
+        target for target, in get_deleted_rows(
+            instance, origin, (counter.target,), counted_deleted,
+        )
+        if not is_deleted(target_model, target, origin)
+    ], -1)
@@ -0,0 +1,244 @@
+from collections import namedtuple
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.db import models, transaction
+from scipy import sparse
+
+from .models import (
+    Recipe, RecipeIngredient, RecipeSimilarity, SimilarityUpdate,
+)
+
+INGREDIENT_WEIGHT = 0.7
+TAG_WEIGHT = 0.3
+CHUNK_SIZE = 256
+BATCH_SIZE = 5000
+
+Features = namedtuple('Features', ('recipe_ids', 'ingredients', 'tags'))
+
+
+def get_feature_matrix(recipe_ids, pairs, weight):
+    """Бинарная матрица рецепт × признак с нормированными строками.
+
+    Строки умножены на корень из веса признака, поэтому скалярное
+    произведение строк даёт взвешенное косинусное сходство.
+    """
+
+    pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+    rows = np.searchsorted(recipe_ids, pairs[:, 0])
+    known = rows < len(recipe_ids)
+    known[known] = recipe_ids[rows[known]] == pairs[known, 0]
+    rows = rows[known]
+    features, columns = np.unique(pairs[known, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, columns)),
+        shape=(len(recipe_ids), len(features)),
+    )
+    norms = np.sqrt(np.maximum(matrix.getnnz(axis=1), 1))
+    return (sparse.diags(np.sqrt(weight) / norms) @ matrix).astype(
+        np.float32,
+    ).tocsr()
+
+
+def get_features():
+    """Идентификаторы рецептов и матрицы их ингредиентов и тэгов.
+
+    Ингредиентов тысячи, поэтому их матрица разреженная; тэгов
+    единицы, и их матрица хранится плотной, что быстрее при
+    умножении на все рецепты.
+    """
+
+    recipe_ids = np.fromiter(
+        Recipe.objects.order_by('pk').values_list('pk', flat=True),
+        dtype=np.int64,
+    )
+    return Features(
+        recipe_ids,
+        get_feature_matrix(
+            recipe_ids,
+            list(RecipeIngredient.objects.values_list(
+                'recipe_id', 'ingredient_id',
+            )),
+            INGREDIENT_WEIGHT,
+        ),
+        get_feature_matrix(
+            recipe_ids,
+            list(Recipe.tags.through.objects.values_list(
+                'recipe_id', 'tag_id',
+            )),
+            TAG_WEIGHT,
+        ).toarray(),
+    )
+
+
+def get_scores(features, rows, transposed=None):
+    """Сходство рецептов из строк rows со всеми рецептами."""
+
+    if transposed is None:
+        transposed = features.ingredients.T.tocsc()
+    return (
+        (features.ingredients[rows] @ transposed).toarray()
+        + features.tags[rows] @ features.tags.T
+    )
+
+
+def get_rows(recipe_ids, pks):
+    """Номера строк матрицы для существующих рецептов из pks."""
+
+    return np.intersect1d(recipe_ids, pks, return_indices=True)[1]
+
+
+def get_similarities(features, rows, limit):
+    """Ближайшие рецепты для строк матрицы, пачками по CHUNK_SIZE."""
+
+    recipe_ids = features.recipe_ids
+    limit = min(limit, len(recipe_ids) - 1)
+    if limit < 1:
+        return
+    transposed = features.ingredients.T.tocsc()
+    for start in range(0, len(rows), CHUNK_SIZE):
+        chunk = rows[start:start + CHUNK_SIZE]
+        scores = get_scores(features, chunk, transposed)
+        scores[np.arange(len(chunk)), chunk] = 0
+        top = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+        values = np.take_along_axis(scores, top, axis=1)
+        found = values > 0
+        for recipe, similar, score in zip(
+            recipe_ids[np.broadcast_to(chunk[:, None], top.shape)[found]]
+            .tolist(),
+            recipe_ids[top[found]].tolist(),
+            values[found].round(6).tolist(),
+        ):
+            yield RecipeSimilarity(
+                recipe_id=recipe, similar_id=similar, score=score,
+            )
+
+
+def save_similarities(similarities, batch_size):
+    count = 0
+    while True:
+        batch = list(islice(similarities, batch_size))
+        if not batch:
+            return count
+        RecipeSimilarity.objects.bulk_create(batch, ignore_conflicts=True)
+        count += len(batch)
+
+
+def get_last_update():
+    return SimilarityUpdate.objects.aggregate(
+        last=models.Max('pk'),
+    )['last'] or 0
+
+
+def build_similarities(limit, batch_size):
+    """Полный пересчёт похожих рецептов.
+
+    Возвращает количество записанных пар.
+    """
+
+    last_update = get_last_update()
+    features = get_features()
+    with transaction.atomic():
+        RecipeSimilarity.objects.all().delete()
+        SimilarityUpdate.objects.filter(pk__lte=last_update).delete()
+        return save_similarities(
+            get_similarities(
+                features, np.arange(len(features.recipe_ids)), limit,
+            ),
+            batch_size,
+        )
+
+
+def refresh_similarities(pks, limit=None, features=None):
+    """Пересчёт похожих рецептов только для рецептов pks."""
+
+    limit = limit or settings.SIMILAR_RECIPES_LIMIT
+    features = features or get_features()
+    with transaction.atomic():
+        RecipeSimilarity.objects.filter(recipe__in=pks).delete()
+        return save_similarities(
+            get_similarities(
+                features, get_rows(features.recipe_ids, pks), limit,
+            ),
+            BATCH_SIZE,
+        )
+
+
+def update_similarities(pks, refresh=(), limit=None, features=None):
+    """Пересчёт после изменения ингредиентов или тэгов рецептов pks.
+
+    Кроме самих рецептов и рецептов refresh пересчитываются только
+    те, в чьих списках они были, и те, в чьи списки они теперь
+    попадают: сходство с ними не меньше худшего в списке или список
+    ещё не заполнен.
+    """
+
+    limit = limit or settings.SIMILAR_RECIPES_LIMIT
+    features = features or get_features()
+    recipe_ids = features.recipe_ids
+    affected = set(pks) | set(refresh)
+    affected.update(RecipeSimilarity.objects.filter(
+        similar__in=pks,
+    ).values_list('recipe_id', flat=True))
+    rows = get_rows(recipe_ids, list(pks))
+    if len(rows):
+        best = np.zeros(len(recipe_ids), dtype=np.float32)
+        transposed = features.ingredients.T.tocsc()
+        for start in range(0, len(rows), CHUNK_SIZE):
+            chunk = rows[start:start + CHUNK_SIZE]
+            scores = get_scores(features, chunk, transposed)
+            scores[np.arange(len(chunk)), chunk] = 0
+            best = np.maximum(best, scores.max(axis=0))
+        thresholds = {
+            recipe: (count, worst)
+            for recipe, count, worst in RecipeSimilarity.objects.order_by(
+            ).values('recipe').annotate(
+                count=models.Count('pk'), worst=models.Min('score'),
+            ).values_list('recipe', 'count', 'worst')
+        }
+        for row in np.flatnonzero(best > 0):
+            count, worst = thresholds.get(int(recipe_ids[row]), (0, 0))
+            if count < limit or best[row] >= worst:
+                affected.add(int(recipe_ids[row]))
+    return refresh_similarities(
+        sorted(affected), limit, features,
+    )
+
+
+def queue_similarity_updates(pks, features_changed=True):
+    """Ставит рецепты pks в очередь пересчёта похожих рецептов.
+
+    Вызывается в транзакции изменения рецептов и стоит один INSERT;
+    сам пересчёт выполняет process_similarity_updates.
+    """
+
+    SimilarityUpdate.objects.bulk_create(
+        SimilarityUpdate(recipe=pk, features_changed=features_changed)
+        for pk in pks
+    )
+
+
+def process_similarity_updates(limit=None):
+    """Пересчёт похожих рецептов по очереди изменений.
+
+    Матрица признаков и худшие сходства загружаются один раз на все
+    накопившиеся изменения. Обработанные записи удаляются по
+    наибольшему прочитанному номеру, поэтому записи, добавленные во
+    время пересчёта, останутся до следующего запуска.
+
+    Возвращает количество записанных пар.
+    """
+
+    last_update = get_last_update()
+    if not last_update:
+        return 0
+    changed = set()
+    refresh = set()
+    for recipe, features_changed in SimilarityUpdate.objects.filter(
+        pk__lte=last_update,
+    ).values_list('recipe', 'features_changed'):
+        (changed if features_changed else refresh).add(recipe)
+    count = update_similarities(changed, refresh - changed, limit)
+    SimilarityUpdate.objects.filter(pk__lte=last_update).delete()
+    return count
@@ -19,12 +19,12 @@ class CustomUserAdmin(admin.ModelAdmin):
         'last_name',
     )
     list_filter = (
-        'email',
-        'username',
+        'is_staff',
+        'is_active',
     )
     search_fields = (
-        'email',
-        'username',
+        '^email',
+        '^username',
     )
 
 
@@ -36,5 +36,6 @@ class SubscriptionAdmin(admin.ModelAdmin):
         'author',
         'subscriber',
     )
-    list_filter = ('author',)
-    search_fields = ('author',)
+    list_select_related = ('author', 'subscriber')
+    autocomplete_fields = ('author', 'subscriber')
+    search_fields = ('^author__username', '^subscriber__username')
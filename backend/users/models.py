@@ -1,7 +1,32 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
 
 
+class CustomUserQuerySet(models.QuerySet):
+    """Queryset пользователей с вычисляемыми полями."""
+
+    def with_is_subscribed(self, user):
+        """Добавляет флаг подписки текущего пользователя на автора."""
+
+        if user is None or user.is_anonymous:
+            return self.annotate(
+                is_subscribed=models.Value(
+                    False, output_field=models.BooleanField(),
+                ),
+            )
+        return self.annotate(
+            is_subscribed=models.Exists(
+                Subscription.objects.filter(
+                    author=models.OuterRef('pk'), subscriber=user,
+                )
+            ),
+        )
+
+
+class CustomUserManager(UserManager.from_queryset(CustomUserQuerySet)):
+    """Менеджер пользователей."""
+
+
 class CustomUser(AbstractUser):
     """Модель пользователя."""
 
@@ -29,6 +54,18 @@ class CustomUser(AbstractUser):
         help_text='Введите фамилию.',
         unique=True,
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество рецептов',
+    )
+    subscribers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество подписчиков',
+    )
+
+    objects = CustomUserManager()
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = (